@@ -5,6 +5,17 @@ import logging
 import time
 import psutil
 
+import passwd_index
+from csv_validate import preflight
+from hash_pool import hash_rows
+from file_classifier import FileClassifier
+from log_scan import LogScanner
+from log_summary import DEFAULT_SUMMARY_FILE, ErrorSummary
+from organize_rules import RuleSet
+from organizer import Organizer
+from home_reclaim import reclaim_home
+from user_db import provision_users
+
 # Set up logging
 logging.basicConfig(filename='error_log.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -17,25 +28,44 @@ def create_user(username, role):
     logging.info(f"User  '{username}' created successfully with home directory /home/{username}")
     logging.info(f"Role '{role}' assigned with full access permissions.")
 
+def read_batch_rows(file):
+    reader = csv.DictReader(file)
+    for row in reader:
+        username = row['username']
+        role = row['role']
+        password = row['password']
+        if role not in ['admin', 'user']:
+            logging.error(f"Invalid role specified for user '{username}' in CSV file.")
+            continue
+        if passwd_index.user_exists(username):
+            logging.error(f"User  '{username}' already exists. Skipping.")
+            continue
+        yield username, role, password
+
 def create_batch_users(csv_file):
+    # Unlike the sudo commands above, batch creation writes /etc/passwd, /etc/shadow and /etc/group itself
+    if os.geteuid() != 0:
+        logging.error("Batch user creation must run as root.")
+        raise SystemExit("Batch user creation writes the account files directly; run it as root.")
+    if not preflight(csv_file):
+        return
+    # Home directories are stamped out from a prebuilt /etc/skel template
+    # instead of one useradd -m copy per user
     with open(csv_file, mode='r') as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            username = row['username']
-            role = row['role']
-            password = row['password']
-            if role not in ['admin', 'user']:
-                logging.error(f"Invalid role specified for user '{username}' in CSV file.")
-                continue
-            if os.system(f'id -u {username} > /dev/null 2>&1') == 0:
-                logging.error(f"User  '{username}' already exists. Skipping.")
-                continue
-            create_user(username, role)
-            os.system(f'echo "{username}:{password}" | sudo chpasswd')
+        provision_users(hash_rows(read_batch_rows(file)))
 
 def delete_user(username):
-    os.system(f'sudo userdel -r {username}')
+    home = f'/home/{username}'
+    if passwd_index.user_exists(username):
+        home = passwd_index.get_index().get_user(username)[5]
     logging.info(f"Deleting user '{username}'")
+    if os.system(f'sudo userdel {username}') != 0:
+        logging.error(f"Failed to delete user '{username}'.")
+        return
+    # The home belongs to the deleted user, so it is trashed with sudo as well
+    if reclaim_home(username, home, sudo=True) is False:
+        logging.error(f"User '{username}' was deleted, but its home directory {home} could not be removed.")
+        return
     logging.info(f"User  '{username}' deleted successfully.")
 
 def update_user(username, password=None):
@@ -44,25 +74,27 @@ def update_user(username, password=None):
         logging.info(f"Updating information for user '{username}'")
         logging.info(f"Password updated successfully for '{username}'.")
 
-def organize_files(directory):
+def organize_files(directory, recursive=False, sniff=False, rules_file=None):
     logging.info(f"Organizing files in {directory} by type")
-    for filename in os.listdir(directory):
-        if os.path.isfile(os.path.join(directory, filename)):
-            file_extension = filename.split('.')[-1]
-            target_dir = os.path.join(directory, f"{file_extension}_files")
-            os.makedirs(target_dir, exist_ok=True)
-            os.rename(os.path.join(directory, filename), os.path.join(target_dir, filename))
-            logging.info(f"Moved .{file_extension} files to {target_dir}")
-    logging.info("Directory organization complete.")
+    # Each file goes to an <extension>_files folder, found in one pass over the directory
+    # With sniff, files are classified by their first bytes, so README lands in txt_files
+    classifier = FileClassifier() if sniff else None
+    # A rules file replaces the <extension>_files layout
+    rules = RuleSet.load(rules_file) if rules_file else None
+    moved = Organizer(recursive=recursive, classifier=classifier, rules=rules).organize(directory)
+    logging.info(f"Directory organization complete. Moved {moved} files.")
 
 def monitor_logs(log_file):
     logging.info(f"Monitoring {log_file} for critical messages")
-    with open(log_file, 'r') as file:
-        for line in file:
-            if "Error" in line:
-                logging.warning(f"Critical message found: {line.strip()}")
-                with open('error_summary.log', 'a') as summary_file:
-                    summary_file.write(line)
+    # Repeats of a message are counted under one template and written once at the end
+    summary = ErrorSummary()
+    for _, line in LogScanner(['Error'], ignore_case=False).scan_path(log_file):
+        line = line.decode(errors='replace')
+        logging.warning(f"Critical message found: {line.strip()}")
+        summary.add(line)
+    if summary.total:
+        summary.write(DEFAULT_SUMMARY_FILE)
+        logging.info(f"Summarized {summary.total} critical messages in {DEFAULT_SUMMARY_FILE}.")
 
 def monitor_system():
     logging.info("System health check every 1 minute for 10 minutes")
@@ -98,6 +130,9 @@ def main():
     # Organize files command
     organize_parser = subparsers.add_parser('organize')
     organize_parser.add_argument('--dir', type=str)
+    organize_parser.add_argument('--recursive', action='store_true')
+    organize_parser.add_argument('--sniff', action='store_true')
+    organize_parser.add_argument('--rules', type=str)
     organize_parser.add_argument('--log-monitor', type=str)
 
     # Monitor system command
@@ -120,7 +155,7 @@ def main():
             update_user(args.username, args.password)
     elif args.command == 'organize':
         if args.dir:
-            organize_files(args.dir)
+            organize_files(args.dir, args.recursive, args.sniff, args.rules)
         elif args.log_monitor:
             monitor_logs(args.log_monitor)
     elif args.command == 'monitor':
@@ -1,14 +1,33 @@
 #!/usr/bin/python
 import os
-import shutil
 import argparse
+import glob
 import logging
 import crypt
-import csv
 import getpass
 import psutil
 import time
 
+import passwd_index
+from csv_journal import CheckpointJournal, batched, stream_csv
+from csv_validate import preflight
+from dir_watch import DEBOUNCE, watch_directory
+from file_archive import COMPRESSIONS, DEFAULT_MAX_ARCHIVE_BYTES, archive_folders, extract_member
+from file_classifier import DEFAULT_CACHE, FileClassifier
+from file_dedupe import collect_files, dedupe
+from hash_pool import hash_rows
+from log_family import expand_logs, scan_family
+from log_follow import DEFAULT_CHECKPOINT_FILE, follow_log
+from log_scan import DEFAULT_CHUNK_SIZE, DEFAULT_KEYWORDS, LogScanner, parallel_scan
+from log_summary import DEFAULT_SUMMARY_FILE, ErrorSummary
+from organize_journal import DEFAULT_JOURNAL_DIR, organize_journaled, undo_run
+from organize_rules import RuleSet, parse_age
+from organizer import DEFAULT_BYTES_IN_FLIGHT, DEFAULT_COPY_WORKERS, FILE_TYPES, SHARD_MODES, Organizer
+from home_reclaim import reclaim_home
+from roles import role_commands
+from user_db import provision_users
+from user_executor import run_commands
+
 
 # Set up centralized logging
 logging.basicConfig(
@@ -24,7 +43,7 @@ logging.basicConfig(
 def user_exists(username) -> bool:
     """Check if a user exists on the system."""
     try:
-        return username in [entry.pw_name for entry in os.scandir('/etc/passwd')]
+        return passwd_index.user_exists(username)
     except Exception as e:
         logging.error(f"Error checking user existence: {e}")
         return False
@@ -39,8 +58,10 @@ def create_user(username, role, password=None):
     try:
         encrypted_password = crypt.crypt(password or "defaultpass123")
         os.system(f"useradd -m -p {encrypted_password} {username}")
-        if role == "admin":
-            os.system(f"usermod -aG sudo {username}")
+        row = run_commands(username, role_commands(username, role))
+        if not row.ok:
+            logging.error(f"Failed to assign role '{role}' to user '{username}': {row.error()}")
+            return
         logging.info(f"User '{username}' created with role '{role}'.")
     except Exception as e:
         logging.error(f"Failed to create user '{username}': {e}")
@@ -53,7 +74,9 @@ def delete_user(username):
         return
 
     try:
-        os.system(f"userdel -r {username}")
+        home = passwd_index.get_index().get_user(username)[5]
+        if os.system(f"userdel {username}") == 0:
+            reclaim_home(username, home)
         logging.info(f"User '{username}' deleted successfully.")
     except Exception as e:
         logging.error(f"Failed to delete user '{username}': {e}")
@@ -74,17 +97,34 @@ def update_user(username, password=None):
         logging.error(f"Failed to update user '{username}': {e}")
 
 
-def create_users_from_csv(csv_file):
-    """Create multiple users from a CSV file."""
+def read_user_rows(records, root="/"):
+    """Yield valid (username, role, password, record) rows for users that do not exist yet."""
+    for record in records:
+        row = record.fields
+        username, role, password = row["username"], row["role"], row["password"]
+        if role not in ["admin", "user"]:
+            logging.error(f"Invalid role '{role}' for user '{username}'. Skipping.")
+            continue
+        if passwd_index.user_exists(username, root):
+            logging.error(f"User '{username}' already exists. Skipping.")
+            continue
+        yield username, role, password or "defaultpass123", record
+
+
+def create_users_from_csv(csv_file, root="/", workers=None, rounds=None, resume=False, from_row=None):
+    """Create multiple users from a CSV file, committing and journaling one chunk at a time."""
     try:
-        with open(csv_file, "r") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                username, role, password = row["username"], row["role"], row["password"]
-                if role not in ["admin", "user"]:
-                    logging.error(f"Invalid role '{role}' for user '{username}'. Skipping.")
-                    continue
-                create_user(username, role, password)
+        # Validate the whole file before any account is created
+        if not preflight(csv_file, root):
+            return
+        journal = CheckpointJournal(f"{csv_file}.journal")
+        with open(csv_file, "rb") as file:
+            records = stream_csv(file, journal, resume=resume, from_row=from_row)
+            # Passwords are hashed in a process pool while earlier chunks are written
+            rows = hash_rows(read_user_rows(records, root), workers, rounds)
+            for chunk in batched(rows):
+                provision_users([row[:3] for row in chunk], root=root)
+                journal.record(row[3] for row in chunk)
         logging.info("Batch user creation completed successfully.")
     except FileNotFoundError:
         logging.error(f"CSV file '{csv_file}' not found.")
@@ -96,40 +136,117 @@ def create_users_from_csv(csv_file):
 # File Organization Functions
 # -----------------------------
 
-def organize_files(directory):
-    """Organize files in a directory based on their type."""
+def organize_files(directory, recursive=False, dest=None, copy_workers=DEFAULT_COPY_WORKERS,
+                   max_in_flight_mb=DEFAULT_BYTES_IN_FLIGHT >> 20, sniff=False, type_cache=DEFAULT_CACHE,
+                   watch=False, debounce=DEBOUNCE, dedupe_action=None, resume=None,
+                   journal_dir=DEFAULT_JOURNAL_DIR, stream=False, shard=None, rules_file=None,
+                   archive_older_than=None, archive_format="gz", archive_max_mb=DEFAULT_MAX_ARCHIVE_BYTES >> 20,
+                   archive_workers=None):
+    """Organize files in a directory based on their type, optionally into folders under dest.
+
+    With watch, keep organizing new files as they arrive until interrupted.
+    Otherwise every move is journaled under a run id that can be resumed or
+    undone. dedupe_action ('report' or 'hardlink') then checks the folders
+    that received files for byte-identical copies. stream and shard are for
+    directories with millions of entries. rules_file is a JSON file of organize
+    rules that replaces the built-in file type table. archive_older_than
+    (e.g. '30d') moves older files in the type folders into compressed tar
+    archives of at most archive_max_mb each.
+    """
     logging.info(f"Organizing files in {directory} by type.")
-    file_types = {
-        "text_files": [".txt"],
-        "log_files": [".log"],
-        "image_files": [".jpg", ".jpeg", ".png"],
-        "pdf_files": [".pdf"],
-    }
-
     try:
-        for folder, extensions in file_types.items():
-            folder_path = os.path.join(directory, folder)
-            os.makedirs(folder_path, exist_ok=True)
-
-            for filename in os.listdir(directory):
-                if any(filename.endswith(ext) for ext in extensions):
-                    src_path = os.path.join(directory, filename)
-                    dest_path = os.path.join(folder_path, filename)
-                    shutil.move(src_path, dest_path)
-                    logging.info(f"Moved {filename} to {folder_path}.")
-        logging.info("Directory organization complete.")
+        classifier = FileClassifier(type_cache) if sniff else None
+        rules = RuleSet.load(rules_file) if rules_file else None
+        organizer = Organizer(FILE_TYPES, recursive, dest, copy_workers, max_in_flight_mb << 20, classifier,
+                              stream=stream, shard=shard, rules=rules)
+        if watch:
+            watch_directory(directory, organizer, debounce)
+            return
+        run_id, moved = organize_journaled(organizer, directory, resume, bool(resume), journal_dir)
+        logging.info(f"Directory organization complete. Moved {moved} files. "
+                     f"Undo with: organize --undo {run_id}")
+        if dedupe_action:
+            dedupe(collect_files(organizer.target_dirs), dedupe_action)
+        if archive_older_than:
+            archives, archived = archive_folders(organizer.type_folders(dest or directory),
+                                                 parse_age(archive_older_than), archive_format,
+                                                 archive_max_mb << 20, archive_workers)
+            logging.info(f"Archived {archived} files older than {archive_older_than} into {archives} archives.")
     except Exception as e:
         logging.error(f"Error organizing files: {e}")
 
 
-def monitor_logs(log_file):
-    """Monitor a log file for critical messages."""
+def undo_organize(run_id, journal_dir=DEFAULT_JOURNAL_DIR):
+    """Move the files of an earlier organize run back where they came from."""
+    try:
+        restored = undo_run(run_id, journal_dir)
+        logging.info(f"Organize run '{run_id}' undone. Restored {restored} files.")
+    except FileNotFoundError as e:
+        logging.error(str(e))
+    except Exception as e:
+        logging.error(f"Error undoing organize run '{run_id}': {e}")
+
+
+def extract_archived(archive, member, out_dir="."):
+    """Restore one file from an organize archive without unpacking the rest."""
+    try:
+        path = extract_member(archive, member, out_dir)
+        logging.info(f"Extracted '{member}' from {archive} to {path}.")
+    except (OSError, KeyError, ValueError) as e:
+        logging.error(f"Error extracting '{member}' from {archive}: {e}")
+
+
+def monitor_logs(log_file, follow=False, checkpoint_file=DEFAULT_CHECKPOINT_FILE, interval=None,
+                 keywords=DEFAULT_KEYWORDS, regexes=(), scan_workers=None, chunk_mb=DEFAULT_CHUNK_SIZE >> 20,
+                 rotated=False, summary_file=None):
+    """Monitor a log file for critical messages.
+
+    A line is critical when it contains any of keywords or matches any of
+    regexes, ignoring case. With follow, only lines added since the last
+    followed run are read; the position is kept in checkpoint_file and
+    survives rotation and truncation. interval keeps following the log,
+    checking it every interval seconds. Otherwise, with scan_workers above
+    one, the file is scanned in chunk_mb pieces by that many processes.
+    log_file may be a glob pattern, and with rotated its rotations
+    (including gzip, bzip2 and xz ones) are read too, oldest first.
+    summary_file gets one line per kind of message, with its count and the
+    first and last time it was seen.
+    """
     logging.info(f"Monitoring log file: {log_file}.")
+    summary = ErrorSummary() if summary_file else None
+
+    def report(line, source=""):
+        logging.warning(f"Critical message found{source}: {line.strip()}")
+        if summary is not None:
+            summary.add(line)
+
     try:
-        with open(log_file, "r") as file:
-            for line in file:
-                if "critical" in line.lower():
-                    logging.warning(f"Critical message found: {line.strip()}")
+        scanner = LogScanner(keywords, regexes)
+        found = 0
+        if follow or interval:
+            found = follow_log(log_file, report, checkpoint_file, interval, scanner)
+            logging.info(f"Found {found} critical messages in the new lines of {log_file}.")
+        elif rotated or glob.has_magic(log_file):
+            paths = expand_logs(log_file, rotated)
+            if not paths:
+                raise FileNotFoundError(log_file)
+            for path, _, line in scan_family(paths, scanner, scan_workers):
+                report(line.decode(errors="replace"), f" in {os.path.basename(path)}")
+                found += 1
+            logging.info(f"Found {found} critical messages in {len(paths)} log files.")
+        else:
+            if scan_workers and scan_workers > 1:
+                matches = parallel_scan(log_file, scanner, scan_workers, chunk_mb << 20)
+            else:
+                matches = scanner.scan_path(log_file)
+            for _, line in matches:
+                report(line.decode(errors="replace"))
+                found += 1
+            logging.info(f"Found {found} critical messages in {log_file}.")
+        if summary is not None:
+            summary.write(summary_file)
+            logging.info(f"Summarized {summary.total} critical messages as {len(summary.templates)} "
+                         f"kinds in {summary_file}.")
     except FileNotFoundError:
         logging.error(f"Log file '{log_file}' not found.")
     except Exception as e:
@@ -187,11 +304,64 @@ def main():
     user_parser.add_argument("--username", help="Username of the user")
     user_parser.add_argument("--role", help="Role of the user (admin/user)")
     user_parser.add_argument("--password", help="Password for the user")
+    user_parser.add_argument("--root", default="/", help="Root prefix holding etc/passwd for batch creation")
+    user_parser.add_argument("--workers", type=int, help="Password hashing processes (default: CPU count)")
+    user_parser.add_argument("--hash-rounds", type=int, help="SHA-512 crypt rounds for batch passwords")
+    user_parser.add_argument("--resume", action="store_true", help="Resume a batch from its checkpoint journal")
+    user_parser.add_argument("--from-row", type=int, help="Start a batch at this CSV data row (1-based)")
 
     # File Organization Commands
     organize_parser = subparsers.add_parser("organize", help="Organize files and monitor logs")
     organize_parser.add_argument("--dir", help="Directory to organize files")
+    organize_parser.add_argument("--recursive", action="store_true", help="Also organize every subdirectory")
+    organize_parser.add_argument("--rules", help="JSON file of rules mapping files to folders")
+    organize_parser.add_argument("--sniff", action="store_true", help="Classify files by content, not just by name")
+    organize_parser.add_argument("--type-cache", default=DEFAULT_CACHE, help="Cache of content types from earlier runs")
+    organize_parser.add_argument("--watch", action="store_true", help="Keep organizing new files as they arrive")
+    organize_parser.add_argument("--debounce", type=float, default=DEBOUNCE,
+                                 help="Seconds a new file must be quiet before it is moved")
+    organize_parser.add_argument("--dedupe", choices=["report", "hardlink"],
+                                 help="Report duplicate files or replace them with hard links")
+    organize_parser.add_argument("--stream", action="store_true",
+                                 help="Read directories lazily, for directories with millions of files")
+    organize_parser.add_argument("--shard", choices=SHARD_MODES,
+                                 help="Split type folders by name hash (256 folders) or by YYYY/MM of mtime")
+    organize_parser.add_argument("--resume", metavar="RUN_ID", help="Resume an interrupted organize run")
+    organize_parser.add_argument("--undo", metavar="RUN_ID", help="Move the files of an organize run back")
+    organize_parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR, help="Where organize runs are journaled")
+    organize_parser.add_argument("--dest", help="Create the type folders under this directory instead")
+    organize_parser.add_argument("--copy-workers", type=int, default=DEFAULT_COPY_WORKERS,
+                                 help="Parallel copies for moves to another filesystem")
+    organize_parser.add_argument("--max-in-flight-mb", type=int, default=DEFAULT_BYTES_IN_FLIGHT >> 20,
+                                 help="Megabytes being copied across filesystems at once")
+    organize_parser.add_argument("--archive-older-than", metavar="AGE",
+                                 help="Archive files in the type folders older than AGE (e.g. 30d, 12h)")
+    organize_parser.add_argument("--archive-format", choices=COMPRESSIONS, default="gz",
+                                 help="Compress archives with gzip or xz (lzma)")
+    organize_parser.add_argument("--archive-max-mb", type=int, default=DEFAULT_MAX_ARCHIVE_BYTES >> 20,
+                                 help="Largest archive to write before starting another")
+    organize_parser.add_argument("--archive-workers", type=int, help="Archives compressed at once (default: CPU count)")
+    organize_parser.add_argument("--extract", metavar="ARCHIVE", help="Archive to restore a file from")
+    organize_parser.add_argument("--member", help="File to restore with --extract, as listed in the archive")
     organize_parser.add_argument("--log-monitor", help="Log file to monitor for critical messages")
+    organize_parser.add_argument("--keyword", action="append", dest="keywords",
+                                 help="Text that marks a critical log line (repeatable; default: critical)")
+    organize_parser.add_argument("--regex", action="append", dest="regexes", default=[],
+                                 help="Regular expression that marks a critical log line (repeatable)")
+    organize_parser.add_argument("--summary", nargs="?", const=DEFAULT_SUMMARY_FILE, metavar="FILE",
+                                 help="Write a count of each kind of critical message (default: error_summary.log)")
+    organize_parser.add_argument("--rotated", action="store_true",
+                                 help="Also scan the log's rotations (.1, .2.gz, .3.xz, ...), oldest first")
+    organize_parser.add_argument("--scan-workers", type=int,
+                                 help="Scan the log in chunks (or rotated logs) with this many processes")
+    organize_parser.add_argument("--scan-chunk-mb", type=int, default=DEFAULT_CHUNK_SIZE >> 20,
+                                 help="Size of the chunks scanned by each process")
+    organize_parser.add_argument("--follow", action="store_true",
+                                 help="Only read log lines added since the last --follow run")
+    organize_parser.add_argument("--follow-every", type=float, metavar="SECONDS",
+                                 help="Keep following the log, checking it every SECONDS")
+    organize_parser.add_argument("--checkpoint-file", default=DEFAULT_CHECKPOINT_FILE,
+                                 help="Where --follow keeps its position in each log")
 
     # System Monitoring Commands
     monitor_parser = subparsers.add_parser("monitor", help="Monitor system health")
@@ -207,7 +377,8 @@ def main():
         if args.create:
             create_user(args.username, args.role, args.password)
         elif args.create_batch:
-            create_users_from_csv(args.create_batch)
+            create_users_from_csv(args.create_batch, args.root, args.workers, args.hash_rounds,
+                                  args.resume, args.from_row)
         elif args.delete:
             delete_user(args.username)
         elif args.update:
@@ -215,10 +386,20 @@ def main():
 
     # Handle File Organization
     elif args.command == "organize":
-        if args.dir:
-            organize_files(args.dir)
+        if args.undo:
+            undo_organize(args.undo, args.journal_dir)
+        elif args.extract and args.member:
+            extract_archived(args.extract, args.member, args.dir or ".")
+        elif args.dir:
+            organize_files(args.dir, args.recursive, args.dest, args.copy_workers, args.max_in_flight_mb,
+                           args.sniff, args.type_cache, args.watch, args.debounce,
+                           args.dedupe, args.resume, args.journal_dir, args.stream, args.shard,
+                           args.rules, args.archive_older_than, args.archive_format, args.archive_max_mb,
+                           args.archive_workers)
         if args.log_monitor:
-            monitor_logs(args.log_monitor)
+            monitor_logs(args.log_monitor, args.follow, args.checkpoint_file, args.follow_every,
+                         args.keywords or ([] if args.regexes else DEFAULT_KEYWORDS), args.regexes,
+                         args.scan_workers, args.scan_chunk_mb, args.rotated, args.summary)
 
     # Handle System Monitoring
     elif args.command == "monitor":
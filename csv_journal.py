@@ -0,0 +1,135 @@
+import csv
+import hashlib
+import logging
+import os
+from collections import namedtuple
+
+# -----------------------------
+# Resumable CSV Ingestion
+# -----------------------------
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# A parsed CSV row with its position in the file and a digest of its raw bytes
+CsvRecord = namedtuple("CsvRecord", "row_number start end digest fields")
+
+
+class CheckpointJournal:
+    """Append-only journal of completed CSV rows: row number, byte range and row hash."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def last(self):
+        """Return the last journaled CsvRecord (without fields), or None."""
+        try:
+            with open(self.path, "rb") as file:
+                file.seek(0, os.SEEK_END)
+                size = file.tell()
+                file.seek(max(0, size - 4096))
+                lines = file.read().splitlines()
+        except FileNotFoundError:
+            return None
+        for line in reversed(lines):
+            parts = line.decode().split()
+            if len(parts) == 4:
+                return CsvRecord(int(parts[0]), int(parts[1]), int(parts[2]), parts[3], None)
+        return None
+
+    def record(self, records):
+        """Append completed rows and fsync them as one batch."""
+        lines = "".join(f"{r.row_number} {r.start} {r.end} {r.digest}\n" for r in records)
+        if not lines:
+            return
+        with open(self.path, "a") as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def reset(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _LineReader:
+    """Feed decoded lines to csv.reader while tracking byte offsets in the binary file."""
+
+    def __init__(self, file, encoding="utf-8"):
+        self.file = file
+        self.encoding = encoding
+        self.offset = file.tell()
+        self.pending = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        self.pending.append(line)
+        return line.decode(self.encoding)
+
+    def seek(self, offset):
+        self.file.seek(offset)
+        self.offset = offset
+        self.pending = []
+
+    def take(self):
+        raw = b"".join(self.pending)
+        self.pending = []
+        return raw
+
+
+def stream_csv(file, journal=None, resume=False, from_row=None):
+    """Yield CsvRecords from a CSV file opened in binary mode.
+
+    With resume, the row recorded last in the journal is re-read and its hash
+    checked before streaming continues right after it. With from_row, rows
+    before that 1-based data row are parsed but not yielded.
+    """
+    lines = _LineReader(file)
+    reader = csv.reader(lines)
+    fieldnames = next(reader, None)
+    if fieldnames is None:
+        return
+    lines.take()
+    row_number = 0
+
+    last = journal.last() if resume and journal and not from_row else None
+    if last is not None:
+        lines.seek(last.start)
+        next(reader, None)
+        if hashlib.sha1(lines.take()).hexdigest() != last.digest:
+            raise ValueError(f"CSV file changed since row {last.row_number} was journaled.")
+        row_number = last.row_number
+        logging.info(f"Resuming CSV ingestion after row {row_number} (offset {last.end}).")
+    elif journal and not resume:
+        journal.reset()
+
+    while True:
+        start = lines.offset
+        values = next(reader, None)
+        if values is None:
+            break
+        raw = lines.take()
+        row_number += 1
+        if from_row and row_number < from_row:
+            continue
+        yield CsvRecord(row_number, start, lines.offset, hashlib.sha1(raw).hexdigest(),
+                        dict(zip(fieldnames, values)))
+
+
+def batched(rows, size=DEFAULT_CHUNK_SIZE):
+    """Group an iterable into lists of at most size items."""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,107 @@
+import csv
+import logging
+import re
+from collections import namedtuple
+
+import passwd_index
+
+# -----------------------------
+# Batch CSV Pre-flight Validation
+# -----------------------------
+
+VALID_ROLES = ("admin", "user")
+REQUIRED_COLUMNS = ("username", "role", "password")
+PASSWORD_MIN_LENGTH = 6
+
+# Same rules as useradd's default NAME_REGEX: lowercase, at most 32 characters
+USERNAME_PATTERN = re.compile(r"[a-z_][a-z0-9_-]{0,30}\$?")
+
+Problem = namedtuple("Problem", "row_number username message")
+
+
+def read_columns(csv_file):
+    """Read a CSV into a header and one list per column; ragged rows are reported separately."""
+    with open(csv_file, "r", newline="") as file:
+        reader = csv.reader(file)
+        header = next(reader, None) or []
+        width = len(header)
+        rows = list(reader)
+    ragged = [number for number, row in enumerate(rows, 1) if len(row) != width]
+    if ragged:
+        rows = [(row + [""] * width)[:width] for row in rows]
+    columns = [list(column) for column in zip(*rows)] if rows else [[] for _ in header]
+    return header, dict(zip(header, columns)), ragged
+
+
+def validate_csv(csv_file, root="/", roles=VALID_ROLES, ignore_role_case=False,
+                 min_password_length=PASSWORD_MIN_LENGTH):
+    """Check a whole batch CSV before any account is touched.
+
+    Every check runs over a full column at once. Returns (errors, warnings):
+    errors must be fixed before the batch can run, warnings (users that
+    already exist) are rows the batch will skip.
+    """
+    header, columns, ragged = read_columns(csv_file)
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        return [Problem(0, "", f"Missing column(s): {', '.join(missing)}")], []
+
+    usernames = columns["username"]
+    role_column = columns["role"]
+    if ignore_role_case:
+        role_column = [role.lower() for role in role_column]
+    passwords = columns["password"]
+    valid_roles = set(roles)
+    errors = [Problem(n, usernames[n - 1], "Wrong number of columns") for n in ragged]
+
+    match = USERNAME_PATTERN.fullmatch
+    errors += [Problem(n, name, "Invalid username syntax")
+               for n, name in enumerate(usernames, 1) if not match(name)]
+
+    if len(set(usernames)) != len(usernames):
+        first_seen = {}
+        for n, name in enumerate(usernames, 1):
+            if first_seen.setdefault(name, n) != n:
+                errors.append(Problem(n, name, f"Duplicate username (first seen on row {first_seen[name]})"))
+
+    errors += [Problem(n, name, f"Invalid role '{role}'")
+               for n, (name, role) in enumerate(zip(usernames, role_column), 1) if role not in valid_roles]
+
+    errors += [Problem(n, name, "Password violates policy")
+               for n, (name, password) in enumerate(zip(usernames, passwords), 1)
+               if len(password) < min_password_length or password == name
+               or ":" in password or "\n" in password]
+
+    index = passwd_index.get_index(root)
+    index.refresh()
+    if "uid" in columns:
+        uids = columns["uid"]
+        errors += [Problem(n, name, f"UID {uid} is already in use")
+                   for n, (name, uid) in enumerate(zip(usernames, uids), 1)
+                   if uid.isdigit() and int(uid) in index.users_by_uid]
+        errors += [Problem(n, name, f"Invalid UID '{uid}'")
+                   for n, (name, uid) in enumerate(zip(usernames, uids), 1) if uid and not uid.isdigit()]
+
+    existing = index.users_by_name
+    warnings = [Problem(n, name, "User already exists and will be skipped")
+                for n, name in enumerate(usernames, 1) if name in existing]
+
+    errors.sort(key=lambda problem: problem.row_number)
+    return errors, warnings
+
+
+def format_problems(problems):
+    return "\n".join(f"Row {p.row_number} ({p.username}): {p.message}" if p.row_number
+                     else p.message for p in problems)
+
+
+def preflight(csv_file, root="/", ignore_role_case=False):
+    """Validate a batch CSV, log every problem and return True if the batch may run."""
+    errors, warnings = validate_csv(csv_file, root, ignore_role_case=ignore_role_case)
+    for problem in warnings:
+        logging.warning(f"{csv_file}: {format_problems([problem])}")
+    for problem in errors:
+        logging.error(f"{csv_file}: {format_problems([problem])}")
+    if errors:
+        logging.error(f"Pre-flight found {len(errors)} problems in '{csv_file}'. No users were created.")
+    return not errors
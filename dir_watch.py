@@ -0,0 +1,204 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import threading
+import time
+
+from organizer import PathEntry
+
+# -----------------------------
+# Event-driven Directory Watching
+# -----------------------------
+
+# inotify event bits from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+DEBOUNCE = 0.5
+QUEUE_SIZE = 64
+MAX_PATHS_PER_ITEM = 1000
+
+# Queue items asking the worker to scan the whole directory, or to exit
+RESCAN = "rescan"
+STOP = "stop"
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    return _libc
+
+
+class DirectoryWatcher:
+    """Keeps a directory organized by moving files as inotify reports them finished.
+
+    A file is handled once it has been quiet for `debounce` seconds after its
+    last IN_CLOSE_WRITE or IN_MOVED_TO. Ready files go through a bounded queue
+    to a single worker; when the worker falls behind the reader blocks, and if
+    the kernel's event queue overflows meanwhile the whole directory is
+    scanned again instead.
+    """
+
+    def __init__(self, directory, organizer, debounce=DEBOUNCE, queue_size=QUEUE_SIZE):
+        self.directory = directory
+        self.organizer = organizer
+        self.debounce = debounce
+        self.work = queue.Queue(maxsize=queue_size)
+        self.watches = {}  # watch descriptor -> directory path
+        self.pending = {}  # path -> time of its last event
+        self.fd = None
+        self.moved = 0
+        self.rescans = 0
+
+    def add_watch(self, path):
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_ONLYDIR
+        if self.organizer.recursive:
+            mask |= IN_CREATE
+        wd = _inotify().inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_add_watch failed: {os.strerror(error)}", path)
+        self.watches[wd] = path
+
+    def add_tree(self, path):
+        """Watch a directory and, in recursive mode, every subdirectory that is not a type folder."""
+        self.add_watch(path)
+        if not self.organizer.recursive:
+            return
+        pending = [path]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and not self.organizer.is_target(entry.name):
+                        self.add_watch(entry.path)
+                        pending.append(entry.path)
+
+    def read_events(self):
+        """Drain the inotify descriptor into the pending map; returns False on queue overflow."""
+        now = time.monotonic()
+        while True:
+            try:
+                data = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                return True
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b"\0")
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    return False
+                if mask & IN_IGNORED:
+                    self.watches.pop(wd, None)
+                    continue
+                parent = self.watches.get(wd)
+                if parent is None or not name:
+                    continue
+                path = os.path.join(parent, os.fsdecode(name))
+                if mask & IN_ISDIR:
+                    if self.organizer.recursive and not self.organizer.is_target(os.fsdecode(name)):
+                        # Files may have landed before the watch existed, so scan the new tree once
+                        self.add_tree(path)
+                        self.work.put([path])
+                    continue
+                # IN_CREATE is only there to find new subdirectories; a new file is moved
+                # once its writer closes it (or it is moved in), never while it is open
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    self.pending[path] = now
+
+    def take_ready(self):
+        """Remove and return the pending paths that have been quiet long enough."""
+        cutoff = time.monotonic() - self.debounce
+        ready = [path for path, last in self.pending.items() if last <= cutoff]
+        for path in ready:
+            del self.pending[path]
+        return ready
+
+    def process(self, item):
+        if item == RESCAN:
+            self.rescans += 1
+            moved = self.organizer.organize(self.directory)
+        else:
+            moved = 0
+            entries = []
+            for path in item:
+                if os.path.isdir(path):
+                    moved += self.organizer.organize(self.directory, self.organizer.scan(path))
+                    continue
+                entry = PathEntry(path)
+                if entry.is_file():
+                    folder = self.organizer.classify(entry)
+                    if folder:
+                        entries.append((entry, folder))
+            if entries:
+                moved += self.organizer.organize(self.directory, entries)
+        self.moved += moved
+        if moved:
+            logging.info(f"Watch: moved {moved} files in {self.directory}.")
+
+    def worker(self):
+        while True:
+            item = self.work.get()
+            if item == STOP:
+                return
+            try:
+                self.process(item)
+            except Exception as e:
+                logging.error(f"Error organizing files in {self.directory}: {e}")
+
+    def run(self, stop=None):
+        """Watch until interrupted or until the optional threading.Event is set."""
+        stop = stop or threading.Event()
+        self.fd = _inotify().inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        worker = threading.Thread(target=self.worker, name="organize-watch", daemon=True)
+        worker.start()
+        try:
+            self.add_tree(self.directory)
+            # Files that arrived before the watch was set up
+            self.work.put(RESCAN)
+            logging.info(f"Watching {self.directory} for new files.")
+            while not stop.is_set():
+                timeout = 1.0
+                if self.pending:
+                    # Never wake for less than a fifth of the debounce, so ready files come in batches
+                    timeout = max(self.debounce / 5, min(self.pending.values()) + self.debounce - time.monotonic())
+                readable, _, _ = select.select([self.fd], [], [], timeout)
+                if readable and not self.read_events():
+                    logging.warning(f"inotify queue overflowed; rescanning {self.directory}.")
+                    self.pending.clear()
+                    self.work.put(RESCAN)
+                ready = self.take_ready()
+                for start in range(0, len(ready), MAX_PATHS_PER_ITEM):
+                    self.work.put(ready[start:start + MAX_PATHS_PER_ITEM])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.work.put(STOP)
+            worker.join()
+            os.close(self.fd)
+            logging.info(f"Stopped watching {self.directory}: {self.moved} files moved, "
+                         f"{self.rescans} full scans.")
+
+
+def watch_directory(directory, organizer, debounce=DEBOUNCE, queue_size=QUEUE_SIZE):
+    DirectoryWatcher(directory, organizer, debounce, queue_size).run()
@@ -0,0 +1,206 @@
+import io
+import json
+import logging
+import lzma
+import os
+import tarfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+# -----------------------------
+# Age-based Archival of Organized Files
+# -----------------------------
+
+ARCHIVE_DIR_NAME = ".archive"
+INDEX_SUFFIX = ".index.json"
+DEFAULT_MAX_ARCHIVE_BYTES = 1 << 30
+COMPRESSIONS = ("gz", "xz")
+READ_SIZE = 1 << 20
+
+
+def _compressor(compression):
+    if compression == "gz":
+        return zlib.compressobj(6, zlib.DEFLATED, 31)  # 31: gzip framing
+    return lzma.LZMACompressor(lzma.FORMAT_XZ, preset=6)
+
+
+def _decompress(compression, data):
+    if compression == "gz":
+        return zlib.decompressobj(31).decompress(data)
+    return lzma.LZMADecompressor(lzma.FORMAT_XZ).decompress(data)
+
+
+def _write_member(out, compression, chunks):
+    """Compress chunks as one self-contained gzip member / xz stream; returns its compressed length."""
+    compressor = _compressor(compression)
+    start = out.tell()
+    for chunk in chunks:
+        out.write(compressor.compress(chunk))
+    out.write(compressor.flush())
+    return out.tell() - start
+
+
+def _member_chunks(path, info):
+    yield info.tobuf(format=tarfile.PAX_FORMAT)
+    # Exactly info.size bytes, even if the file grows or shrinks while it is read
+    remaining = info.size
+    with open(path, "rb") as file:
+        while remaining:
+            chunk = file.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    if remaining:
+        yield b"\0" * remaining
+    padding = -info.size % tarfile.BLOCKSIZE
+    if padding:
+        yield b"\0" * padding
+
+
+def write_archive(archive_path, files, compression="gz"):
+    """Write (path, member name) files into a tar archive with a sidecar index.
+
+    Each member is compressed as its own gzip member or xz stream. The result
+    is still an ordinary .tar.gz / .tar.xz, but the index records where every
+    member starts, so one file can be extracted without reading the rest.
+    Returns the index entries.
+    """
+    members = []
+    tmp_path = f"{archive_path}.tmp"
+    with open(tmp_path, "wb") as out:
+        for path, name in files:
+            st = os.stat(path)
+            info = tarfile.TarInfo(name)
+            info.size = st.st_size
+            info.mtime = st.st_mtime
+            info.mode = st.st_mode & 0o7777
+            info.uid, info.gid = st.st_uid, st.st_gid
+            offset = out.tell()
+            length = _write_member(out, compression, _member_chunks(path, info))
+            members.append({"name": name, "offset": offset, "length": length, "size": st.st_size,
+                            "mtime_ns": st.st_mtime_ns})
+        # End-of-archive marker
+        _write_member(out, compression, [b"\0" * (2 * tarfile.BLOCKSIZE)])
+        out.flush()
+        os.fsync(out.fileno())
+    index = {"archive": os.path.basename(archive_path), "compression": compression, "members": members}
+    with open(f"{archive_path}{INDEX_SUFFIX}.tmp", "w") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, archive_path)
+    os.replace(f"{archive_path}{INDEX_SUFFIX}.tmp", f"{archive_path}{INDEX_SUFFIX}")
+    return members
+
+
+def _write_archive_task(task):
+    archive_path, files, compression = task
+    try:
+        return archive_path, write_archive(archive_path, files, compression), None
+    except OSError as e:
+        for path in (f"{archive_path}.tmp", f"{archive_path}{INDEX_SUFFIX}.tmp"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return archive_path, [], str(e)
+
+
+def extract_member(archive_path, name, out_dir="."):
+    """Extract one member using the sidecar index; only that member is decompressed."""
+    with open(f"{archive_path}{INDEX_SUFFIX}", "r") as file:
+        index = json.load(file)
+    member = next((m for m in index["members"] if m["name"] == name), None)
+    if member is None:
+        raise KeyError(f"'{name}' is not in {archive_path}.")
+    with open(archive_path, "rb") as file:
+        file.seek(member["offset"])
+        data = _decompress(index["compression"], file.read(member["length"]))
+    with tarfile.open(fileobj=io.BytesIO(data), mode="r:") as tar:
+        info = tar.next()
+        target = os.path.join(out_dir, os.path.basename(info.name))
+        with tar.extractfile(info) as source, open(target, "wb") as dest:
+            while True:
+                chunk = source.read(READ_SIZE)
+                if not chunk:
+                    break
+                dest.write(chunk)
+    os.utime(target, (info.mtime, info.mtime))
+    return target
+
+
+def old_files(folder, cutoff):
+    """Yield (path, member name, stat) for files under folder last modified before cutoff."""
+    pending = [folder]
+    while pending:
+        path = pending.pop()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != ARCHIVE_DIR_NAME:
+                        pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_mtime < cutoff:
+                        yield entry.path, os.path.relpath(entry.path, folder), st
+
+
+def archive_folders(folders, max_age, compression="gz", max_bytes=DEFAULT_MAX_ARCHIVE_BYTES, workers=None):
+    """Move files older than max_age seconds from each folder into compressed tar archives.
+
+    Archives go to '<folder>/.archive/<folder>-<timestamp>-<n>.tar.<gz|xz>' and
+    are written in parallel worker processes. A file is only removed after
+    its archive is complete, and only if it has not changed in the meantime.
+    Returns (archives written, files archived).
+    """
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown compression '{compression}'.")
+    cutoff = time.time() - max_age
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    tasks = []
+    for folder in folders:
+        chunk, chunk_bytes, number = [], 0, 0
+        archive_dir = os.path.join(folder, ARCHIVE_DIR_NAME)
+        for path, name, st in old_files(folder, cutoff):
+            if chunk and chunk_bytes + st.st_size > max_bytes:
+                number += 1
+                tasks.append((archive_dir, f"{os.path.basename(folder)}-{stamp}-{number}", chunk))
+                chunk, chunk_bytes = [], 0
+            chunk.append((path, name))
+            chunk_bytes += st.st_size
+        if chunk:
+            number += 1
+            tasks.append((archive_dir, f"{os.path.basename(folder)}-{stamp}-{number}", chunk))
+    if not tasks:
+        return 0, 0
+
+    jobs = []
+    originals = {}
+    for archive_dir, base, files in tasks:
+        os.makedirs(archive_dir, exist_ok=True)
+        archive_path = os.path.join(archive_dir, f"{base}.tar.{compression}")
+        originals[archive_path] = files
+        jobs.append((archive_path, files, compression))
+
+    archives = archived = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for archive_path, members, error in pool.map(_write_archive_task, jobs):
+            if error:
+                logging.error(f"Failed to write archive '{archive_path}': {error}")
+                continue
+            archives += 1
+            stored = {member["name"]: member for member in members}
+            for path, name in originals[archive_path]:
+                member = stored.get(name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                # Keep files that changed after they were read into the archive
+                if member and (st.st_size, st.st_mtime_ns) == (member["size"], member["mtime_ns"]):
+                    os.unlink(path)
+                    archived += 1
+                else:
+                    logging.warning(f"'{path}' changed while it was archived; leaving it in place.")
+            logging.info(f"Archived {len(members)} files into {archive_path}.")
+    return archives, archived
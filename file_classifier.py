@@ -0,0 +1,153 @@
+import logging
+import os
+
+# -----------------------------
+# Content-based File Classification
+# -----------------------------
+
+DEFAULT_CACHE = os.path.expanduser("~/.cache/sys_admin/file_types.tsv")
+
+# Enough to reach the tar header magic at offset 257
+SNIFF_BYTES = 512
+
+# (offset, magic bytes, extension), checked in order
+MAGIC_NUMBERS = (
+    (0, b"\x89PNG\r\n\x1a\n", ".png"),
+    (0, b"\xff\xd8\xff", ".jpg"),
+    (0, b"GIF87a", ".gif"),
+    (0, b"GIF89a", ".gif"),
+    (0, b"%PDF-", ".pdf"),
+    (0, b"%!PS", ".ps"),
+    (0, b"{\\rtf", ".rtf"),
+    (0, b"PK\x03\x04", ".zip"),
+    (0, b"\x1f\x8b", ".gz"),
+    (0, b"BZh", ".bz2"),
+    (0, b"\xfd7zXZ\x00", ".xz"),
+    (0, b"7z\xbc\xaf\x27\x1c", ".7z"),
+    (0, b"\x7fELF", ".elf"),
+    (8, b"WEBP", ".webp"),
+    (257, b"ustar", ".tar"),
+)
+
+# Name extensions that agree with each content type; a file named with one of them keeps its name's type
+CONTENT_FAMILIES = {
+    ".png": (".png",),
+    ".jpg": (".jpg", ".jpeg", ".jpe", ".jfif"),
+    ".gif": (".gif",),
+    ".pdf": (".pdf", ".ai"),
+    ".ps": (".ps", ".eps"),
+    ".rtf": (".rtf", ".doc"),
+    ".zip": (".zip", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".jar", ".war", ".ear",
+             ".apk", ".epub", ".whl", ".xpi", ".kmz", ".nupkg", ".vsix"),
+    ".gz": (".gz", ".tgz", ".svgz"),
+    ".bz2": (".bz2", ".tbz", ".tbz2"),
+    ".xz": (".xz", ".txz"),
+    ".7z": (".7z",),
+    ".elf": (".elf", ".so", ".o", ".ko", ".bin", ".out", ".axf"),
+    ".webp": (".webp",),
+    ".tar": (".tar",),
+}
+
+# Cached value for files that matched nothing, so they are not read again either
+UNKNOWN = "-"
+
+
+def sniff_bytes(header):
+    """Return the extension the header bytes call for: a magic number match, '.txt' or None."""
+    for offset, magic, extension in MAGIC_NUMBERS:
+        if header.startswith(magic, offset):
+            return extension
+    if not header or b"\0" in header:
+        return None
+    # A multi-byte character may be cut off at the end of the sample
+    for cut in range(4):
+        try:
+            header[:len(header) - cut].decode("utf-8")
+            return ".txt"
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+class FileClassifier:
+    """Classifies files by their first bytes, with results cached by (device, inode, size, mtime).
+
+    The cache is a plain text file that survives between runs, so files that
+    have not changed since the last run are classified without being opened.
+    Moving a file keeps its key, so an organized tree stays cached too.
+    """
+
+    def __init__(self, cache_path=DEFAULT_CACHE):
+        self.cache_path = cache_path
+        self.cache = {}
+        self.seen = set()
+        self.dirty = False
+        self.reads = 0
+        self.hits = 0
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.cache_path, "r") as file:
+                for line in file:
+                    parts = line.split()
+                    if len(parts) == 5:
+                        self.cache[tuple(map(int, parts[:4]))] = parts[4]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable file type cache '{self.cache_path}': {e}")
+            self.cache = {}
+
+    def sniff(self, entry):
+        """Return the content extension for a DirEntry, or None to classify it by name.
+
+        The content only overrides a name whose extension is missing, unknown,
+        or of another kind than the content (e.g. a PNG named .txt); photo.jpeg
+        and report.docx keep their own extensions. Text files keep theirs too;
+        only extensionless text becomes '.txt'.
+        """
+        st = entry.stat()
+        if st.st_size == 0:
+            return None
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        self.seen.add(key)
+        extension = self.cache.get(key)
+        if extension is None:
+            fd = os.open(entry.path, os.O_RDONLY)
+            try:
+                header = os.pread(fd, SNIFF_BYTES, 0)
+            finally:
+                os.close(fd)
+            self.reads += 1
+            # The cache holds what the content is, independent of the file's current name
+            extension = self.cache[key] = sniff_bytes(header) or UNKNOWN
+            self.dirty = True
+        else:
+            self.hits += 1
+
+        if extension == UNKNOWN:
+            return None
+        dot = entry.name.rfind(".")
+        name_extension = entry.name[dot:].lower() if dot > 0 else ""
+        if extension == ".txt":
+            return None if name_extension else extension
+        if name_extension in CONTENT_FAMILIES.get(extension, (extension,)):
+            return None
+        return extension
+
+    def save(self, max_entries=1_000_000):
+        """Write the cache back atomically; past max_entries only this run's files are kept."""
+        logging.info(f"File type cache: {self.hits} hits, {self.reads} files read.")
+        if not self.dirty:
+            return
+        entries = self.cache
+        if len(entries) > max_entries:
+            entries = {key: value for key, value in entries.items() if key in self.seen}
+        os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.writelines(f"{dev} {ino} {size} {mtime} {extension}\n"
+                            for (dev, ino, size, mtime), extension in entries.items())
+        os.replace(tmp_path, self.cache_path)
+        self.dirty = False
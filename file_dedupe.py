@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import os
+import stat
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+# -----------------------------
+# Duplicate File Detection
+# -----------------------------
+
+PREFIX_BYTES = 64 << 10
+READ_SIZE = 1 << 20
+PROGRESS_INTERVAL = 10
+
+# One file found during the scan: path and the stat fields used to confirm it is unchanged
+FileInfo = namedtuple("FileInfo", "path dev ino size mtime_ns mode uid gid")
+
+DedupeStats = namedtuple("DedupeStats", "files groups duplicates reclaimable linked bytes_hashed seconds")
+
+
+def file_info(entry):
+    st = entry.stat(follow_symlinks=False)
+    return FileInfo(entry.path, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, st.st_mode, st.st_uid, st.st_gid)
+
+
+def collect_files(directories):
+    """FileInfo for every regular file directly inside the given directories."""
+    for directory in directories:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_file(follow_symlinks=False):
+                        yield file_info(entry)
+        except FileNotFoundError:
+            continue
+
+
+def hash_prefix(path, size=PREFIX_BYTES):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return hashlib.blake2b(os.pread(fd, size, 0)).digest()
+    finally:
+        os.close(fd)
+
+
+def hash_file(path):
+    digest = hashlib.blake2b()
+    with open(path, "rb", buffering=0) as file:
+        buffer = bytearray(READ_SIZE)
+        view = memoryview(buffer)
+        while True:
+            count = file.readinto(buffer)
+            if not count:
+                break
+            digest.update(view[:count])
+    return digest.digest()
+
+
+def _hash_file_or_none(path):
+    try:
+        return hash_file(path)
+    except OSError:
+        return None
+
+
+def _group(files, key):
+    groups = {}
+    for info in files:
+        groups.setdefault(key(info), []).append(info)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class Throughput:
+    """Counts hashed bytes and logs the rate at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self):
+        self.total = 0
+        self.done = 0
+        self.started = time.monotonic()
+        self.logged = self.started
+
+    @property
+    def seconds(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rate(self):
+        """MiB hashed per second so far."""
+        return self.done / max(self.seconds, 1e-9) / (1 << 20)
+
+    def add(self, nbytes):
+        self.done += nbytes
+        now = time.monotonic()
+        if now - self.logged >= PROGRESS_INTERVAL:
+            self.logged = now
+            logging.info(f"Dedupe: hashed {self.done >> 20} of {self.total >> 20} MiB ({self.rate:.1f} MiB/s).")
+
+
+def find_duplicates(files, workers=None, throughput=None):
+    """Group byte-identical files; returns lists of FileInfo with the one to keep first.
+
+    Files are grouped by size, then by a hash of their first PREFIX_BYTES, and
+    only files whose prefixes collide are hashed in full, in a process pool.
+    Paths that are already hard links of each other count once.
+    """
+    throughput = throughput or Throughput()
+    unique_inodes = {}
+    for info in files:
+        if info.size:
+            unique_inodes.setdefault((info.dev, info.ino), info)
+    candidates = [info for group in _group(unique_inodes.values(), lambda info: info.size) for info in group]
+
+    prefixes = {}
+    throughput.total += sum(min(info.size, PREFIX_BYTES) for info in candidates)
+    for info in candidates:
+        try:
+            prefixes[info.path] = hash_prefix(info.path)
+            throughput.add(min(info.size, PREFIX_BYTES))
+        except OSError as e:
+            logging.warning(f"Dedupe: skipping unreadable file '{info.path}': {e}")
+    collisions = _group([info for info in candidates if info.path in prefixes],
+                        lambda info: (info.size, prefixes[info.path]))
+
+    # Files no longer than the prefix are already fully hashed
+    duplicates = [group for group in collisions if group[0].size <= PREFIX_BYTES]
+    to_hash = [info for group in collisions if group[0].size > PREFIX_BYTES for info in group]
+    if to_hash:
+        throughput.total += sum(info.size for info in to_hash)
+        digests = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_hash_file_or_none, [info.path for info in to_hash], chunksize=4)
+            for info, digest in zip(to_hash, results):
+                if digest is None:
+                    logging.warning(f"Dedupe: skipping unreadable file '{info.path}'.")
+                    continue
+                digests[info.path] = digest
+                throughput.add(info.size)
+        duplicates += _group([info for info in to_hash if info.path in digests],
+                             lambda info: (info.size, digests[info.path]))
+
+    for group in duplicates:
+        group.sort(key=lambda info: (info.mtime_ns, info.path))
+    duplicates.sort(key=lambda group: group[0].path)
+    return duplicates
+
+
+def _unchanged(info):
+    try:
+        st = os.stat(info.path, follow_symlinks=False)
+    except OSError:
+        return False
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns) == (info.dev, info.ino, info.size, info.mtime_ns)
+
+
+def hardlink_duplicate(keep, duplicate):
+    """Replace duplicate with a hard link to keep; returns False when it is not safe to."""
+    if keep.dev != duplicate.dev:
+        return False
+    if (stat.S_IMODE(keep.mode), keep.uid, keep.gid) != (stat.S_IMODE(duplicate.mode), duplicate.uid, duplicate.gid):
+        return False
+    if not (_unchanged(keep) and _unchanged(duplicate)):
+        return False
+    tmp_path = os.path.join(os.path.dirname(duplicate.path), f".{os.path.basename(duplicate.path)}.dedupe")
+    os.link(keep.path, tmp_path)
+    try:
+        os.replace(tmp_path, duplicate.path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def dedupe(files, action="report", workers=None):
+    """Find duplicates among FileInfo records and report them or replace them with hard links.
+
+    Returns a DedupeStats with the throughput of the hashing stage.
+    """
+    files = list(files)
+    throughput = Throughput()
+    groups = find_duplicates(files, workers, throughput)
+    duplicates = reclaimable = linked = 0
+    for keep, *others in groups:
+        for duplicate in others:
+            duplicates += 1
+            reclaimable += duplicate.size
+            if action == "hardlink":
+                try:
+                    if hardlink_duplicate(keep, duplicate):
+                        linked += 1
+                        logging.info(f"Dedupe: linked '{duplicate.path}' to '{keep.path}'.")
+                        continue
+                    logging.warning(f"Dedupe: left '{duplicate.path}' in place (different device, "
+                                    f"owner, mode, or changed since it was hashed).")
+                except OSError as e:
+                    logging.error(f"Dedupe: failed to link '{duplicate.path}': {e}")
+            else:
+                logging.info(f"Dedupe: '{duplicate.path}' duplicates '{keep.path}'.")
+
+    stats = DedupeStats(len(files), len(groups), duplicates, reclaimable, linked,
+                        throughput.done, throughput.seconds)
+    logging.info(f"Dedupe: {stats.files} files, {stats.duplicates} duplicates in {stats.groups} groups, "
+                 f"{stats.reclaimable >> 20} MiB reclaimable, {stats.linked} linked; "
+                 f"hashed {stats.bytes_hashed >> 20} MiB in {stats.seconds:.1f}s ({throughput.rate:.1f} MiB/s).")
+    return stats
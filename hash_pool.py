@@ -0,0 +1,84 @@
+import crypt
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from csv_journal import batched
+
+# -----------------------------
+# Parallel Password Hashing
+# -----------------------------
+
+DEFAULT_CHUNK_SIZE = 64
+
+
+def hash_password(password, rounds=None):
+    """Hash one password with SHA-512 crypt, optionally with a custom round count."""
+    return crypt.crypt(password, crypt.mksalt(crypt.METHOD_SHA512, rounds=rounds))
+
+
+def _hash_chunk(rows, rounds):
+    return [(*row[:2], hash_password(row[2], rounds), *row[3:]) for row in rows]
+
+
+def password_matches(password, password_hash) -> bool:
+    """Check a plain password against an existing crypt hash."""
+    if not password_hash or password_hash[0] in "!*":
+        return False
+    return crypt.crypt(password, password_hash) == password_hash
+
+
+def _verify_chunk(pairs):
+    return [password_matches(password, password_hash) for password, password_hash in pairs]
+
+
+def hash_rows(rows, workers=None, rounds=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Hash (username, role, password) rows in a process pool.
+
+    Yields (username, role, password_hash) in input order; any extra fields
+    after the password are passed through unchanged. Only a bounded
+    number of chunks is in flight, so rows are read lazily and results can be
+    consumed while later chunks are still hashing.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in batched(rows, chunk_size):
+            yield from _hash_chunk(chunk, rounds)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in batched(rows, chunk_size):
+            pending.append(pool.submit(_hash_chunk, chunk, rounds))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def hash_passwords(passwords, workers=None, rounds=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Hash plain passwords in a process pool, yielding hashes in input order."""
+    rows = ((None, None, password) for password in passwords)
+    for _, _, password_hash in hash_rows(rows, workers, rounds, chunk_size):
+        yield password_hash
+
+
+def verify_passwords(pairs, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Check (password, password_hash) pairs in a process pool, yielding bools in input order.
+
+    Like hash_rows, at most twice as many chunks as workers are in flight.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for chunk in batched(pairs, chunk_size):
+            yield from _verify_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in batched(pairs, chunk_size):
+            pending.append(pool.submit(_verify_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
@@ -0,0 +1,116 @@
+import fcntl
+import logging
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------
+# Home Directory Provisioning
+# -----------------------------
+
+# ioctl that shares a whole file's extents with another file (btrfs, XFS, bcachefs)
+FICLONE = 0x40049409
+
+DEFAULT_WORKERS = 8
+
+
+class SkeletonTemplate:
+    """A skeleton directory scanned once and stamped out into many home directories."""
+
+    def __init__(self, skel_dir):
+        self.skel_dir = skel_dir
+        self.entries = []   # (relative path, st_mode, symlink target)
+        self.method = None  # "reflink", "copy_file_range" or "copy", picked on first copy
+        if os.path.isdir(skel_dir):
+            self._scan("")
+
+    def _scan(self, relative):
+        with os.scandir(os.path.join(self.skel_dir, relative)) as entries:
+            for entry in entries:
+                path = os.path.join(relative, entry.name)
+                st = entry.stat(follow_symlinks=False)
+                if entry.is_symlink():
+                    self.entries.append((path, st.st_mode, os.readlink(entry.path)))
+                elif entry.is_dir(follow_symlinks=False):
+                    self.entries.append((path, st.st_mode, None))
+                    self._scan(path)
+                elif entry.is_file(follow_symlinks=False):
+                    self.entries.append((path, st.st_mode, None))
+
+    def _copy_file(self, src, dst):
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            if self.method in (None, "reflink"):
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    self.method = "reflink"
+                    return
+                except OSError:
+                    self.method = None if self.method is None else "copy_file_range"
+            if self.method in (None, "copy_file_range"):
+                try:
+                    size = os.fstat(fsrc.fileno()).st_size
+                    while size > 0:
+                        copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), size)
+                        if copied == 0:
+                            break
+                        size -= copied
+                    self.method = "copy_file_range"
+                    return
+                except OSError:
+                    # copy_file_range advanced both offsets, so start over from the beginning
+                    fsrc.seek(0)
+                    fdst.seek(0)
+                    fdst.truncate()
+                    self.method = "copy"
+            while True:
+                chunk = fsrc.read(1 << 20)
+                if not chunk:
+                    break
+                fdst.write(chunk)
+
+    def provision(self, home_path, uid, gid, mode=0o700):
+        """Create one home directory from the template and set ownership and modes in one pass."""
+        os.makedirs(os.path.dirname(home_path), exist_ok=True)
+        os.mkdir(home_path)
+        for relative, st_mode, target in self.entries:
+            dst = os.path.join(home_path, relative)
+            if target is not None:
+                os.symlink(target, dst)
+            elif stat.S_ISDIR(st_mode):
+                os.makedirs(dst, exist_ok=True)
+            else:
+                self._copy_file(os.path.join(self.skel_dir, relative), dst)
+
+        # Ownership and permissions are applied from the template's entry list
+        # without walking the new tree again
+        if os.geteuid() == 0:
+            for relative, _, _ in self.entries:
+                os.chown(os.path.join(home_path, relative), uid, gid, follow_symlinks=False)
+            os.chown(home_path, uid, gid)
+        for relative, st_mode, target in self.entries:
+            if target is None:
+                os.chmod(os.path.join(home_path, relative), stat.S_IMODE(st_mode))
+        os.chmod(home_path, mode)
+
+
+def provision_homes(root, homes, skel_dir=None, workers=DEFAULT_WORKERS):
+    """Create (home, uid, gid) home directories under a root prefix in parallel.
+
+    Returns the number of homes that were created.
+    """
+    template = SkeletonTemplate(skel_dir or os.path.join(root, "etc", "skel"))
+
+    def provision(home):
+        path, uid, gid = home
+        try:
+            template.provision(os.path.join(root, path.lstrip("/")), uid, gid)
+            return True
+        except OSError as e:
+            logging.error(f"Failed to create home directory '{path}': {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        created = sum(pool.map(provision, homes))
+    logging.info(f"Created {created} home directories from '{template.skel_dir}' "
+                 f"using {template.method or 'no'} file copies.")
+    return created
@@ -0,0 +1,245 @@
+import argparse
+import fcntl
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------
+# Background Home Reclamation
+# -----------------------------
+
+TRASH_DIR_NAME = ".trash"
+LOCK_NAME = ".reclaim.lock"
+PROGRESS_SUFFIX = ".progress"
+DEFAULT_WORKERS = 4
+
+
+def trash_dir_for(home_path):
+    """Trash lives next to the homes so moving a home into it is a same-filesystem rename."""
+    return os.path.join(os.path.dirname(os.path.normpath(home_path)), TRASH_DIR_NAME)
+
+
+def trash_home(home_path, username, sudo=False):
+    """Atomically move a home directory into the trash area and return its new path.
+
+    With sudo, the move runs through sudo like the userdel before it, for
+    callers that are not root themselves.
+    """
+    if os.path.islink(home_path) or not os.path.isdir(home_path):
+        return None
+    trash = trash_dir_for(home_path)
+    target = os.path.join(trash, f"{username}.{int(time.time())}.{os.getpid()}")
+    if sudo:
+        for command in (["sudo", "mkdir", "-p", "-m", "700", trash], ["sudo", "mv", "-T", home_path, target]):
+            result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                    stderr=subprocess.PIPE, text=True)
+            if result.returncode != 0:
+                raise OSError(f"'{' '.join(command)}' exited with {result.returncode}: {result.stderr.strip()}")
+    else:
+        os.makedirs(trash, mode=0o700, exist_ok=True)
+        os.rename(home_path, target)
+    logging.info(f"Moved home directory '{home_path}' to '{target}' for background removal.")
+    return target
+
+
+def start_reclaimer(trash, workers=DEFAULT_WORKERS, rate_limit=None, sudo=False):
+    """Start a detached reclaimer process for a trash directory, under non-interactive sudo if asked."""
+    command = [sys.executable, os.path.abspath(__file__), trash, "--workers", str(workers)]
+    if sudo:
+        command = ["sudo", "-n", *command]
+    if rate_limit:
+        command += ["--rate-limit", str(rate_limit)]
+    subprocess.Popen(command, start_new_session=True, stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def reclaim_home(username, home, root="/", background=True, sudo=False):
+    """Trash a deleted user's home and make sure a reclaimer will remove it.
+
+    Returns the home's path in the trash, None when there was no home
+    directory, or False when it could not be moved.
+    """
+    try:
+        target = trash_home(os.path.join(root, home.lstrip("/")), username, sudo)
+    except OSError as e:
+        logging.error(f"Failed to move home directory of '{username}' to trash: {e}")
+        return False
+    if target and background:
+        start_reclaimer(os.path.dirname(target), sudo=sudo)
+    return target
+
+
+class RateLimiter:
+    """Token bucket shared by all reclaimer threads, in bytes per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class Progress:
+    """Counts removed files and bytes and publishes them to a sidecar file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = 0
+        self.bytes = 0
+        self.started = time.time()
+        self.written = 0
+        self.lock = threading.Lock()
+
+    def add(self, files, nbytes):
+        with self.lock:
+            self.files += files
+            self.bytes += nbytes
+
+    def publish(self, force=False):
+        now = time.time()
+        if not force and now - self.written < 1:
+            return
+        self.written = now
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"files": self.files, "bytes": self.bytes, "started": self.started,
+                       "updated": now}, file)
+        os.replace(tmp_path, self.path)
+
+
+def _clear_directory(path, limiter, progress):
+    """Unlink every non-directory entry and return the subdirectories."""
+    subdirs = []
+    files = 0
+    nbytes = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+                continue
+            size = entry.stat(follow_symlinks=False).st_size
+            limiter.consume(size)
+            os.unlink(entry.path)
+            files += 1
+            nbytes += size
+    progress.add(files, nbytes)
+    return subdirs
+
+
+def remove_tree(path, pool, limiter, progress):
+    """Remove a tree level by level: parallel scandir/unlink, then rmdir deepest first."""
+    level = [path]
+    directories = []
+    while level:
+        directories.extend(level)
+        next_level = []
+        for subdirs in pool.map(lambda d: _clear_directory(d, limiter, progress), level):
+            next_level.extend(subdirs)
+        progress.publish()
+        level = next_level
+    for directory in reversed(directories):
+        os.rmdir(directory)
+
+
+def pending_entries(trash):
+    try:
+        names = os.listdir(trash)
+    except FileNotFoundError:
+        return []
+    return sorted(name for name in names
+                  if not name.startswith(".") and not name.endswith((PROGRESS_SUFFIX, ".tmp")))
+
+
+def run_reclaimer(trash, workers=DEFAULT_WORKERS, rate_limit=None):
+    """Empty a trash directory; only one reclaimer runs per trash directory at a time."""
+    lock_fd = os.open(os.path.join(trash, LOCK_NAME), os.O_WRONLY | os.O_CREAT, 0o600)
+    try:
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info(f"A reclaimer is already running for '{trash}'.")
+            return
+        limiter = RateLimiter(rate_limit)
+        failed = set()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # New entries may be trashed while we work, so keep going until none are left
+            while True:
+                entries = [name for name in pending_entries(trash) if name not in failed]
+                if not entries:
+                    break
+                for name in entries:
+                    path = os.path.join(trash, name)
+                    progress = Progress(path + PROGRESS_SUFFIX)
+                    try:
+                        remove_tree(path, pool, limiter, progress)
+                    except OSError as e:
+                        logging.error(f"Failed to reclaim '{path}': {e}")
+                        failed.add(name)
+                        continue
+                    os.remove(progress.path)
+                    logging.info(f"Reclaimed '{path}': {progress.files} files, {progress.bytes} bytes.")
+    finally:
+        os.close(lock_fd)
+
+
+def purge_status(trash):
+    """Describe every home directory still waiting in a trash directory."""
+    status = []
+    for name in pending_entries(trash):
+        username, trashed, _ = name.rsplit(".", 2) if name.count(".") >= 2 else (name, "", "")
+        entry = {"username": username, "path": os.path.join(trash, name),
+                 "trashed": int(trashed) if trashed.isdigit() else None,
+                 "files": 0, "bytes": 0, "state": "pending"}
+        try:
+            with open(os.path.join(trash, name + PROGRESS_SUFFIX), "r") as file:
+                entry.update(json.load(file))
+            entry["state"] = "removing"
+        except (FileNotFoundError, ValueError):
+            pass
+        status.append(entry)
+    return status
+
+
+def format_purge_status(trash):
+    status = purge_status(trash)
+    if not status:
+        return f"[INFO] Nothing pending in '{trash}'."
+    lines = []
+    for entry in status:
+        trashed = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["trashed"])) if entry["trashed"] else "?"
+        lines.append(f"{entry['username']}: {entry['state']} since {trashed}, "
+                     f"{entry['files']} files / {entry['bytes']} bytes removed so far")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Remove trashed home directories in the background")
+    parser.add_argument("trash", help="Trash directory to empty")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel scandir/unlink threads")
+    parser.add_argument("--rate-limit", type=int, help="Maximum bytes freed per second")
+    args = parser.parse_args()
+
+    logging.basicConfig(filename="sys_admin.log", level=logging.INFO,
+                        format="%(asctime)s - %(levelname)s - %(message)s")
+    run_reclaimer(args.trash, args.workers, args.rate_limit)
+
+
+if __name__ == "__main__":
+    main()
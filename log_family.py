@@ -0,0 +1,99 @@
+import bz2
+import glob
+import gzip
+import logging
+import lzma
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from log_scan import bounded_map
+
+# -----------------------------
+# Rotated and Compressed Log Families
+# -----------------------------
+
+# Leading bytes of each compression format, and how to open it as a stream
+OPENERS = (
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+)
+ROTATED_SUFFIX = r"(?:[.-]\d+)?(?:\.(?:gz|bz2|xz|lzma))?"
+
+
+def open_log(path):
+    """Open a plain, gzip, bzip2 or xz log for binary reading; compressed ones are decompressed as a stream."""
+    with open(path, "rb") as file:
+        head = file.read(6)
+    for magic, opener in OPENERS:
+        if head.startswith(magic):
+            return opener(path, "rb")
+    return open(path, "rb", buffering=0)
+
+
+def rotation_family(log_file):
+    """log_file and its rotations next to it (syslog.1, syslog.2.gz, syslog-20261018.xz, ...)."""
+    directory, base = os.path.split(os.path.abspath(log_file))
+    pattern = re.compile(re.escape(base) + ROTATED_SUFFIX)
+    with os.scandir(directory) as entries:
+        return [entry.path for entry in entries
+                if entry.is_file() and pattern.fullmatch(entry.name)]
+
+
+def expand_logs(pattern, rotated=False):
+    """Files named by a glob pattern (or a single path), plus their rotations when rotated is set.
+
+    Sorted oldest first by modification time, which rotation and compression preserve.
+    """
+    paths = set(glob.glob(pattern)) if glob.has_magic(pattern) else {pattern}
+    if rotated:
+        for path in list(paths):
+            paths.update(rotation_family(path))
+    paths = {os.path.abspath(path) for path in paths if os.path.isfile(path)}
+    return sorted(paths, key=lambda path: (os.stat(path).st_mtime, path))
+
+
+def _scan_log(task):
+    scanner, path = task
+    try:
+        with open_log(path) as file:
+            return path, list(scanner.scan(file)), None
+    except (OSError, EOFError, lzma.LZMAError) as e:
+        return path, [], str(e)
+
+
+def scan_family(paths, scanner, workers=None):
+    """Yield (path, offset, line) for matching lines of every log, oldest log first.
+
+    Each log is decompressed and scanned in a worker process; offsets are
+    into the decompressed text. Matches are yielded log by log as each one
+    is done, with at most twice as many logs as workers in flight. Logs that
+    cannot be read are logged and skipped.
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(paths) == 1 or workers == 1:
+        for path in paths:
+            yield from _scan_serial(scanner, path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = ((scanner, path) for path in paths)
+        for path, matches, error in bounded_map(pool, _scan_log, tasks, 2 * workers):
+            if error:
+                _log_error(path, error)
+                continue
+            for offset, line in matches:
+                yield path, offset, line
+
+
+def _scan_serial(scanner, path):
+    try:
+        with open_log(path) as file:
+            for offset, line in scanner.scan(file):
+                yield path, offset, line
+    except (OSError, EOFError, lzma.LZMAError) as e:
+        _log_error(path, e)
+
+
+def _log_error(path, error):
+    logging.error(f"Error reading log file '{path}': {error}")
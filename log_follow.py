@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+import time
+
+from log_scan import line_blocks
+
+# -----------------------------
+# Incremental Log Following
+# -----------------------------
+
+DEFAULT_CHECKPOINT_FILE = os.path.expanduser("~/.local/state/sys_admin/logs/checkpoints.json")
+
+
+class Checkpoints:
+    """(device, inode, offset) of every followed log, keyed by its absolute path."""
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_FILE):
+        self.path = path
+        try:
+            with open(path, "r") as file:
+                self.logs = json.load(file)
+        except FileNotFoundError:
+            self.logs = {}
+
+    def get(self, log_file):
+        checkpoint = self.logs.get(os.path.abspath(log_file))
+        return tuple(checkpoint) if checkpoint else None
+
+    def set(self, log_file, dev, ino, offset):
+        self.logs[os.path.abspath(log_file)] = [dev, ino, offset]
+
+    def save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(self.logs, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def read_lines(file, offset, on_line, final=False, scanner=None):
+    """Pass every complete line from offset on to on_line; returns the offset after the last one.
+
+    With a log_scan.LogScanner only the matching lines are passed on. A
+    trailing line without a newline is left for the next read, unless final
+    is set (the file will not grow any more).
+    """
+    for block_offset, buffer, length in line_blocks(file, offset, final=final):
+        if scanner is None:
+            for line in buffer[:length].splitlines():
+                on_line(line.decode(errors="replace"))
+        else:
+            for start, end in scanner.spans(buffer, length):
+                on_line(buffer[start:end].decode(errors="replace"))
+        offset = block_offset + length
+    return offset
+
+
+def find_rotated(log_file, dev, ino):
+    """Path of the file next to log_file (e.g. syslog.1) that still has the given inode, or None."""
+    directory, base = os.path.split(os.path.abspath(log_file))
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            # DirEntry.inode() needs no stat call
+            if entry.name != base and entry.name.startswith(base) and entry.inode() == ino:
+                if entry.stat(follow_symlinks=False).st_dev == dev:
+                    return entry.path
+    return None
+
+
+def follow_once(log_file, on_line, checkpoints, scanner=None):
+    """Read what was appended to log_file since its checkpoint; returns the number of lines passed to on_line.
+
+    If the log was rotated, the rest of the old file is read first (as long
+    as it has not been compressed yet) and the new file from the start. If
+    it was truncated in place, it is read from the start.
+    """
+    count = 0
+
+    def counted(line):
+        nonlocal count
+        count += 1
+        on_line(line)
+
+    checkpoint = checkpoints.get(log_file)
+    try:
+        st = os.stat(log_file)
+    except FileNotFoundError:
+        st = None
+    offset = 0
+    if checkpoint:
+        dev, ino, offset = checkpoint
+        if st is None or (st.st_dev, st.st_ino) != (dev, ino):
+            rotated = find_rotated(log_file, dev, ino)
+            if rotated:
+                logging.info(f"{log_file} was rotated; finishing {rotated} from byte {offset}.")
+                with open(rotated, "rb", buffering=0) as file:
+                    drained = read_lines(file, offset, counted, True, scanner)
+                if st is None:
+                    # The new log does not exist yet; remember how far the old one was read
+                    checkpoints.set(log_file, dev, ino, drained)
+                    checkpoints.save()
+            else:
+                logging.warning(f"{log_file} was rotated and the old file is gone; "
+                                f"lines after byte {offset} of it were not read.")
+            offset = 0
+        elif st.st_size < offset:
+            logging.warning(f"{log_file} was truncated; reading it from the start.")
+            offset = 0
+    if st is None:
+        if not checkpoint:
+            raise FileNotFoundError(f"Log file '{log_file}' not found.")
+        return count
+
+    with open(log_file, "rb", buffering=0) as file:
+        # Stat the open file: it may have been rotated since the stat above
+        opened = os.fstat(file.fileno())
+        if (opened.st_dev, opened.st_ino) != (st.st_dev, st.st_ino) or opened.st_size < offset:
+            offset = 0
+        st = opened
+        offset = read_lines(file, offset, counted, scanner=scanner)
+    checkpoints.set(log_file, st.st_dev, st.st_ino, offset)
+    checkpoints.save()
+    return count
+
+
+def follow_log(log_file, on_line, checkpoint_file=DEFAULT_CHECKPOINT_FILE, interval=None, scanner=None):
+    """Read new lines of log_file since the last run; with interval, keep following until interrupted.
+
+    Returns the number of lines passed to on_line (only matching ones when a scanner is given).
+    """
+    checkpoints = Checkpoints(checkpoint_file)
+    count = follow_once(log_file, on_line, checkpoints, scanner)
+    if interval is None:
+        return count
+    try:
+        while True:
+            time.sleep(interval)
+            count += follow_once(log_file, on_line, checkpoints, scanner)
+    except KeyboardInterrupt:
+        pass
+    return count
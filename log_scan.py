@@ -0,0 +1,173 @@
+import collections
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+# -----------------------------
+# Bytes-level Log Scanning
+# -----------------------------
+
+BLOCK_SIZE = 4 << 20
+DEFAULT_KEYWORDS = ("critical",)
+DEFAULT_CHUNK_SIZE = 256 << 20
+
+
+def line_blocks(file, start=0, end=None, final=True, block_size=BLOCK_SIZE):
+    """Read file from start to end in large blocks cut at line ends.
+
+    Yields (offset, buffer, length) where buffer[:length] holds whole lines
+    starting at file offset `offset`. One bytearray is reused for every block,
+    so it is only valid until the next one is read. A last line without a
+    newline is yielded only when final is set.
+    """
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    file.seek(start)
+    offset = start
+    filled = 0
+    remaining = None if end is None else end - start
+    while True:
+        want = len(buffer) - filled
+        if remaining is not None:
+            want = min(want, remaining - filled)
+        count = file.readinto(view[filled:filled + want]) if want > 0 else 0
+        if not count:
+            if final and filled:
+                yield offset, buffer, filled
+            return
+        filled += count
+        cut = buffer.rfind(b"\n", 0, filled) + 1
+        if not cut:
+            if filled == len(buffer):
+                # A line longer than the buffer: grow it
+                view.release()
+                buffer.extend(bytes(len(buffer)))
+                view = memoryview(buffer)
+            continue
+        yield offset, buffer, cut
+        tail = filled - cut
+        buffer[:tail] = buffer[cut:filled]
+        offset += cut
+        if remaining is not None:
+            remaining -= cut
+        filled = tail
+
+
+class LogScanner:
+    """Finds the lines that contain any of a set of keywords or regexes.
+
+    Matching runs over whole blocks of bytes: keywords with one C-level
+    substring search each (on a lower-cased copy of the block when
+    ignore_case is set), regexes as one combined pattern. Line boundaries are
+    only looked up around hits.
+    """
+
+    def __init__(self, keywords=DEFAULT_KEYWORDS, regexes=(), ignore_case=True):
+        if not keywords and not regexes:
+            raise ValueError("At least one keyword or regex is required.")
+        self.ignore_case = ignore_case
+        self.keywords = [keyword.encode().lower() if ignore_case else keyword.encode() for keyword in keywords]
+        self.regex = None
+        if regexes:
+            # Blocks hold many lines, so ^ and $ must match at every line, not just the block's edges
+            flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+            self.regex = re.compile(b"|".join(b"(?:%s)" % regex.encode() for regex in regexes), flags)
+
+    def spans(self, buffer, length):
+        """Sorted (start, end) of every line in buffer[:length] with a hit, without its newline."""
+        lines = {}
+
+        def add(position):
+            start = buffer.rfind(b"\n", 0, position) + 1
+            end = buffer.find(b"\n", position, length)
+            if end < 0:
+                end = length
+            lines[start] = end
+            return end + 1
+
+        if self.keywords:
+            haystack = buffer.lower() if self.ignore_case else buffer
+            for keyword in self.keywords:
+                position = haystack.find(keyword, 0, length)
+                while position >= 0:
+                    position = haystack.find(keyword, add(position), length)
+        if self.regex is not None:
+            position = 0
+            while True:
+                match = self.regex.search(buffer, position, length)
+                if match is None:
+                    break
+                position = add(match.start())
+        return sorted(lines.items())
+
+    def scan(self, file, start=0, end=None, final=True):
+        """Yield (offset, line) for every matching line of file between start and end."""
+        for offset, buffer, length in line_blocks(file, start, end, final):
+            for line_start, line_end in self.spans(buffer, length):
+                yield offset + line_start, bytes(buffer[line_start:line_end])
+
+    def scan_path(self, path, start=0, end=None):
+        with open(path, "rb", buffering=0) as file:
+            yield from self.scan(file, start, end)
+
+
+def chunk_ranges(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Split a file into (start, end) byte ranges of about chunk_size, each starting at a line start."""
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, "rb", buffering=0) as file:
+        fd = file.fileno()
+        position = chunk_size
+        while position < size:
+            # The next line starts after the first newline at or after position - 1
+            probe = position - 1
+            while True:
+                data = os.pread(fd, 64 << 10, probe)
+                newline = data.find(b"\n")
+                if newline >= 0 or not data:
+                    break
+                probe += len(data)
+            if newline < 0 or probe + newline + 1 >= size:
+                break
+            start = probe + newline + 1
+            if start > starts[-1]:
+                starts.append(start)
+            position = max(start, position) + chunk_size
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def bounded_map(pool, function, tasks, in_flight):
+    """Yield function(task) for every task, in order, with at most in_flight tasks submitted at once.
+
+    Unlike pool.map, tasks are only taken from the iterable as earlier
+    results are consumed, so results waiting to be read stay bounded.
+    """
+    pending = collections.deque()
+    for task in tasks:
+        if len(pending) >= in_flight:
+            yield pending.popleft().result()
+        pending.append(pool.submit(function, task))
+    while pending:
+        yield pending.popleft().result()
+
+
+def _scan_chunk(task):
+    scanner, path, start, end = task
+    return list(scanner.scan_path(path, start, end))
+
+
+def parallel_scan(path, scanner, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (offset, line) for every matching line, scanning chunks of the file in worker processes.
+
+    Matches come out in file order, as each chunk is done; at most twice as
+    many chunks as workers are scanned or waiting to be read at a time.
+    """
+    ranges = chunk_ranges(path, chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if len(ranges) == 1 or workers == 1:
+        yield from scanner.scan_path(path)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        tasks = ((scanner, path, start, end) for start, end in ranges)
+        for matches in bounded_map(pool, _scan_chunk, tasks, 2 * workers):
+            yield from matches
@@ -0,0 +1,100 @@
+import heapq
+import os
+import re
+
+# -----------------------------
+# Aggregated Error Summary
+# -----------------------------
+
+DEFAULT_SUMMARY_FILE = "error_summary.log"
+MAX_TEMPLATES = 10000
+CACHE_SIZE = 50000
+
+# Variable parts of a message, most specific first; each is replaced by <NAME>
+MASKS = (
+    ("TS", r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?"
+           r"|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) +\d{1,2} \d{2}:\d{2}:\d{2}"
+           r"|\d{2}:\d{2}:\d{2}(?:[.,]\d+)?"),
+    ("UUID", r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"),
+    ("IP", r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"),
+    ("PATH", r"(?<![\w.~])/[^\s'\":,;()\[\]]+"),
+    ("ID", r"\b0x[0-9a-fA-F]+\b|\b(?=[a-fA-F]*\d)[0-9a-fA-F]{8,}\b"),
+    ("NUM", r"(?<!\w)[-+]?\d+(?:\.\d+)?"),
+)
+MASK_REGEX = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in MASKS))
+# Every mask treats all digits alike, so messages that differ only in their digits share a template
+DIGITS = str.maketrans("123456789", "000000000")
+
+
+def template_of(message):
+    """Return (template, (start, end) of the first timestamp or None) for a log message."""
+    span = None
+
+    def mask(match):
+        nonlocal span
+        name = match.lastgroup
+        if name == "TS" and span is None:
+            span = match.span()
+        return f"<{name}>"
+
+    return MASK_REGEX.sub(mask, message), span
+
+
+class ErrorSummary:
+    """Counts messages per template, with the first and last time each was seen.
+
+    At most max_templates templates are kept: when there are more, the least
+    frequent half is dropped and its messages are only counted in `pruned`.
+    Messages without a timestamp of their own are dated by the caller's `seen`.
+    """
+
+    def __init__(self, max_templates=MAX_TEMPLATES):
+        self.max_templates = max_templates
+        self.templates = {}  # template -> [count, first seen, last seen]
+        self.cache = {}  # message with its digits zeroed -> (template, timestamp span)
+        self.total = 0
+        self.pruned = 0
+
+    def add(self, message, seen=None):
+        message = message.strip()
+        key = message.translate(DIGITS)
+        cached = self.cache.get(key)
+        if cached is None:
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            cached = self.cache[key] = template_of(message)
+        template, span = cached
+        timestamp = message[span[0]:span[1]] if span else seen
+        self.total += 1
+        entry = self.templates.get(template)
+        if entry is None:
+            self.templates[template] = [1, timestamp, timestamp]
+            if len(self.templates) > self.max_templates:
+                self._prune()
+            return
+        entry[0] += 1
+        if timestamp is not None:
+            if entry[1] is None:
+                entry[1] = timestamp
+            entry[2] = timestamp
+
+    def _prune(self):
+        keep = heapq.nlargest(self.max_templates // 2, self.templates.items(), key=lambda item: item[1][0])
+        self.pruned += sum(entry[0] for entry in self.templates.values()) - sum(entry[0] for _, entry in keep)
+        self.templates = dict(keep)
+
+    def lines(self):
+        """Summary lines, most frequent template first: count, first seen, last seen, template."""
+        entries = sorted(self.templates.items(), key=lambda item: (-item[1][0], item[0]))
+        lines = [f"{count}\t{first or '-'}\t{last or '-'}\t{template}\n"
+                 for template, (count, first, last) in entries]
+        if self.pruned:
+            lines.append(f"{self.pruned}\t-\t-\t(messages of rarer templates that were not kept)\n")
+        return lines
+
+    def write(self, path=DEFAULT_SUMMARY_FILE):
+        """Replace path with the summary in one buffered write."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write("".join(self.lines()))
+        os.replace(tmp_path, path)
@@ -2,16 +2,13 @@
 import argparse
 import sys
 import crypt
-import pwd
 import subprocess
 
+import passwd_index
+
 
 def user_exists(username) -> bool:
-    try:
-        pwd.getpwnam(username)
-        return True
-    except:
-        return False
+    return passwd_index.user_exists(username)
 
 
 def main():
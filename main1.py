@@ -1,12 +1,18 @@
 #!/usr/bin/python
 import crypt
-import csv
 import getpass
-import pwd
-import subprocess
 import sys
 import logging
 
+import passwd_index
+from csv_journal import CheckpointJournal, batched, stream_csv
+from csv_validate import preflight
+from hash_pool import hash_rows
+from roles import role_commands, role_groups
+from user_db import provision_users
+from home_reclaim import reclaim_home
+from user_executor import run_commands
+
 # Set up logging
 logging.basicConfig(
     filename="sys_admin.log",
@@ -14,16 +20,13 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
+# Admin rights in this script are membership of the root group
+ROLE_GROUPS = role_groups("root")
+
 
 def user_exists(username) -> bool:
     """Check if a user exists in the system."""
-    try:
-        pwd.getpwnam(username)
-        logging.info(f"Checked existence of user '{username}': EXISTS.")
-        return True
-    except KeyError:
-        logging.info(f"Checked existence of user '{username}': DOES NOT EXIST.")
-        return False
+    return passwd_index.user_exists(username)
 
 
 def create_user(username: str):
@@ -36,11 +39,16 @@ def create_user(username: str):
         logging.warning(f"Cannot create user '{username}': Already exists.")
     else:
         try:
-            subprocess.call(["useradd", "-p", en_pwd, username])
-            logging.info(f"User '{username}' created successfully.")
+            commands = [["useradd", "-p", en_pwd, username]]
             if role.lower() == "y":
-                subprocess.call(["usermod", "-aG", "root", username])
-                logging.info(f"Granted root access to user '{username}'.")
+                commands += role_commands(username, "admin", ROLE_GROUPS)
+            row = run_commands(username, commands)
+            if row.ok:
+                logging.info(f"User '{username}' created successfully.")
+                if role.lower() == "y":
+                    logging.info(f"Granted root access to user '{username}'.")
+            else:
+                logging.error(f"Error creating user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Error creating user '{username}': {e}")
 
@@ -62,8 +70,11 @@ def modify_user(username):
         new_pass = getpass.getpass(f"Enter the new password for user '{username}': ")
         en_newpass = crypt.crypt(new_pass)
         try:
-            subprocess.call(["usermod", "-p", en_newpass, username])
-            logging.info(f"Password updated successfully for user '{username}'.")
+            row = run_commands(username, [["usermod", "-p", en_newpass, username]])
+            if row.ok:
+                logging.info(f"Password updated successfully for user '{username}'.")
+            else:
+                logging.error(f"Failed to update password for user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Failed to update password for user '{username}': {e}")
 
@@ -71,7 +82,9 @@ def modify_user(username):
         new_role = input(f"Give user '{username}' root access (y/n)? ")
         if new_role.lower() == "y":
             try:
-                subprocess.call(["usermod", "-aG", "root", username])
+                row = run_commands(username, role_commands(username, "admin", ROLE_GROUPS))
+                if not row.ok:
+                    raise RuntimeError(row.error())
                 logging.info(f"Granted root access to user '{username}'.")
             except Exception as e:
                 logging.error(f"Failed to assign root access to user '{username}': {e}")
@@ -80,15 +93,20 @@ def modify_user(username):
         new_pass = getpass.getpass(f"Enter the new password for user '{username}': ")
         en_newpass = crypt.crypt(new_pass)
         try:
-            subprocess.call(["usermod", "-p", en_newpass, username])
-            logging.info(f"Password updated successfully for user '{username}'.")
+            row = run_commands(username, [["usermod", "-p", en_newpass, username]])
+            if row.ok:
+                logging.info(f"Password updated successfully for user '{username}'.")
+            else:
+                logging.error(f"Failed to update password for user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Failed to update password for user '{username}': {e}")
 
         new_role = input(f"Give user '{username}' root access (y/n)? ")
         if new_role.lower() == "y":
             try:
-                subprocess.call(["usermod", "-aG", "root", username])
+                row = run_commands(username, role_commands(username, "admin", ROLE_GROUPS))
+                if not row.ok:
+                    raise RuntimeError(row.error())
                 logging.info(f"Granted root access to user '{username}'.")
             except Exception as e:
                 logging.error(f"Failed to assign root access to user '{username}': {e}")
@@ -101,11 +119,16 @@ def create_user_two(username, role, password):
     else:
         en_pwd = crypt.crypt(password)
         try:
-            subprocess.call(["useradd", "-p", en_pwd, username])
-            logging.info(f"User '{username}' created successfully.")
+            commands = [["useradd", "-p", en_pwd, username]]
             if role.lower() == "admin":
-                subprocess.call(["usermod", "-aG", "root", username])
-                logging.info(f"Granted admin privileges to user '{username}'.")
+                commands += role_commands(username, "admin", ROLE_GROUPS)
+            row = run_commands(username, commands)
+            if row.ok:
+                logging.info(f"User '{username}' created successfully.")
+                if role.lower() == "admin":
+                    logging.info(f"Granted admin privileges to user '{username}'.")
+            else:
+                logging.error(f"Error creating user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Error creating user '{username}': {e}")
 
@@ -114,8 +137,13 @@ def deletes_user(username):
     """Delete a user from the system."""
     if user_exists(username):
         try:
-            subprocess.call(["userdel", "-r", username])
-            logging.info(f"User '{username}' deleted successfully.")
+            home = passwd_index.get_index().get_user(username)[5]
+            row = run_commands(username, [["userdel", username]])
+            if row.ok:
+                reclaim_home(username, home)
+                logging.info(f"User '{username}' deleted successfully.")
+            else:
+                logging.error(f"Failed to delete user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Failed to delete user '{username}': {e}")
     else:
@@ -135,14 +163,20 @@ def get_option():
     return select_option
 
 
-def create_from_csv(filename):
-    """Create users in batch from a CSV file."""
+def create_from_csv(filename, root="/", resume=False, from_row=None):
+    """Create users in batch from a CSV file, journaling each committed chunk."""
     try:
-        with open(filename, "r") as fPtr:
-            reader = csv.reader(fPtr)
-            next(reader)  # Skip header row
-            for row in reader:
-                create_user_two(row[0], row[1], row[2])
+        # Validate the whole file before any account is created
+        if not preflight(filename, root, ignore_role_case=True):
+            return
+        journal = CheckpointJournal(f"{filename}.journal")
+        with open(filename, "rb") as fPtr:
+            records = stream_csv(fPtr, journal, resume=resume, from_row=from_row)
+            rows = hash_rows((r.fields["username"], r.fields["role"].lower(), r.fields["password"], r)
+                             for r in records)
+            for chunk in batched(rows):
+                provision_users([row[:3] for row in chunk], root=root, admin_group="root", create_homes=False)
+                journal.record(row[3] for row in chunk)
         logging.info(f"Batch creation from '{filename}' completed successfully.")
     except FileNotFoundError:
         logging.error(f"CSV file '{filename}' not found.")
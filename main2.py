@@ -2,17 +2,16 @@
 import argparse
 import sys
 import crypt
-import pwd
-import subprocess
+
+import passwd_index
+from home_reclaim import reclaim_home
+from roles import role_commands
+from user_executor import run_commands
 import csv
 
 
 def user_exists(username) -> bool:
-    try:
-        pwd.getpwnam(username)
-        return True
-    except:
-        return False
+    return passwd_index.user_exists(username)
 
 
 def main():
@@ -85,9 +84,12 @@ def create_user(username: str, password: str, role: str):
     if user_exists(username):
         print(f"The user with name '{username}' already exists. Please try again.")
     else:
-        subprocess.call(["useradd", "-p", en_pwd, username])
-    if role == "admin":
-        subprocess.call(["usermod", "-g", "root", username])
+        commands = [["useradd", "-p", en_pwd, username]]
+        if role == "admin":
+            commands.append(["usermod", "-g", "root", username])
+        row = run_commands(username, commands)
+        if not row.ok:
+            print(f"Creating user '{username}' failed: {row.error()}")
 
 
 def create_user_two(username: str, role: str, password: str):
@@ -95,9 +97,12 @@ def create_user_two(username: str, role: str, password: str):
         print(f"This user {username} exists. It was not created.")
     else:
         en_pwd = crypt.crypt(password)
-        subprocess.call(["useradd", "-p", en_pwd, username])
+        commands = [["useradd", "-p", en_pwd, username]]
         if role == "admin":
-            subprocess.call(["usermod", "-g", "root", username])
+            commands.append(["usermod", "-g", "root", username])
+        row = run_commands(username, commands)
+        if not row.ok:
+            print(f"Creating user '{username}' failed: {row.error()}")
 
 
 def create_from_csv(filename: str):
@@ -111,7 +116,12 @@ def create_from_csv(filename: str):
 
 def deletes_user(username: str):
     if user_exists(username):
-        subprocess.call(["deluser", "--remove-all-files", username])
+        home = passwd_index.get_index().get_user(username)[5]
+        row = run_commands(username, [["deluser", username]])
+        if row.ok:
+            reclaim_home(username, home)
+        else:
+            print(f"Deleting user '{username}' failed: {row.error()}")
     else:
         print(f"The user '{username}' does not exist and cannot be deleted.")
 
@@ -130,14 +140,19 @@ def modify_user(old_username: str, new_username: str, new_password: str, new_rol
     #     if new_role is not None:
     #         subprocess.call(["usermod", "-g", "root", old_username])
     if user_exists(old_username):
+        commands = []
         if new_role == "admin":
-            subprocess.call(["usermod", "-g", "root", old_username])
+            commands.append(["usermod", "-g", "root", old_username])
         if new_role == "user":
-            subprocess.call(["deluser", old_username, "sudo"])
+            commands += role_commands(old_username, "user", downgrade=True)
         if new_password is not None:
-            subprocess.call(["usermod", "-p", new_password, old_username])
+            commands.append(["usermod", "-p", new_password, old_username])
         if new_username is not None:
-            subprocess.call(["usermod", "-l", new_username, old_username])
+            commands.append(["usermod", "-l", new_username, old_username])
+        # The rename runs last, so the earlier commands still see the old name
+        row = run_commands(old_username, commands, stop_on_error=False)
+        if not row.ok:
+            print(f"Modifying user '{old_username}' failed with exit codes {row.returncodes}.")
 
 
 if __name__ == '__main__':
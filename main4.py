@@ -3,8 +3,14 @@ import os
 import psutil
 import time
 import logging
-import shutil
-import re
+
+from file_classifier import FileClassifier
+from file_dedupe import collect_files, dedupe
+from log_follow import follow_log
+from log_scan import LogScanner
+from log_summary import DEFAULT_SUMMARY_FILE, ErrorSummary
+from organize_rules import RuleSet
+from organizer import SHARD_MODES, Organizer
 
 # Set up logging
 logging.basicConfig(
@@ -14,34 +20,57 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def organize_files(directory):
+def organize_files(directory, recursive=False, sniff=False, dedupe_action=None, stream=False, shard=None,
+                   rules_file=None):
     logging.info(f"Organizing files in {directory} by type")
     if not os.path.exists(directory):
         logging.error(f"Directory '{directory}' does not exist.")
         return
-    if not os.listdir(directory):
+    # Only the first entry is read, not the whole (possibly huge) listing
+    with os.scandir(directory) as entries:
+        empty = next(entries, None) is None
+    if empty:
         logging.info(f"Directory '{directory}' is empty. No files to organize.")
         return
-    for filename in os.listdir(directory):
-        if os.path.isfile(os.path.join(directory, filename)):
-            file_extension = filename.split('.')[-1]
-            target_dir = os.path.join(directory, f"{file_extension}_files")
-            os.makedirs(target_dir, exist_ok=True)
-            shutil.move(os.path.join(directory, filename), os.path.join(target_dir, filename))
-            logging.info(f"Moved .{file_extension} files to {target_dir}")
-    logging.info("Directory organization complete.")
-
-def monitor_log(log_file):
+    # Each file goes to an <extension>_files folder, found in one pass over the directory
+    # With sniff, files are classified by their first bytes, so README lands in txt_files
+    classifier = FileClassifier() if sniff else None
+    # stream reads huge directories lazily; shard splits each <extension>_files folder
+    # A rules file replaces the <extension>_files layout
+    rules = RuleSet.load(rules_file) if rules_file else None
+    organizer = Organizer(recursive=recursive, classifier=classifier, stream=stream, shard=shard, rules=rules)
+    moved = organizer.organize(directory)
+    logging.info(f"Directory organization complete. Moved {moved} files.")
+    if dedupe_action:
+        # Byte-identical copies in the <extension>_files folders are reported or hard linked
+        dedupe(collect_files(organizer.target_dirs), dedupe_action)
+
+def monitor_log(log_file, follow=False):
     logging.info(f"Monitoring {log_file} for critical messages")
-    if not os.path.exists(log_file):
+
+    scanner = LogScanner(['critical'])
+    summary = ErrorSummary()
+
+    def report(line):
+        logging.warning(f"Critical message found: {line.strip()}")
+        summary.add(line)
+
+    if follow:
+        # Only the lines added since the last followed run, even across log rotation
+        try:
+            follow_log(log_file, report, scanner=scanner)
+        except FileNotFoundError as e:
+            logging.error(str(e))
+            return
+    elif not os.path.exists(log_file):
         logging.error(f"Log file '{log_file}' does not exist.")
         return
-    with open(log_file, 'r') as file:
-        for line in file:
-            match = re.search(r'critical', line, re.IGNORECASE)
-            if match:
-                logging.warning(f"Critical message found: {line.strip()}")
-    logging.info("Logged critical messages to error_summary.log.")
+    else:
+        for _, line in scanner.scan_path(log_file):
+            report(line.decode(errors='replace'))
+    if summary.total:
+        summary.write(DEFAULT_SUMMARY_FILE)
+        logging.info(f"Logged {summary.total} critical messages to {DEFAULT_SUMMARY_FILE}.")
 
 def monitor_system():
     logging.info("System health check every 1 minute for 10 minutes")
@@ -73,7 +102,14 @@ def main():
     # Organize files command
     organize_parser = subparsers.add_parser('organize')
     organize_parser.add_argument('--dir', type=str, help='Directory to organize files in')
+    organize_parser.add_argument('--recursive', action='store_true', help='Also organize every subdirectory')
+    organize_parser.add_argument('--stream', action='store_true', help='Read directories lazily (millions of files)')
+    organize_parser.add_argument('--shard', choices=SHARD_MODES, help='Split type folders by name hash or by YYYY/MM')
+    organize_parser.add_argument('--dedupe', choices=['report', 'hardlink'], help='Report or hard link duplicate files')
+    organize_parser.add_argument('--rules', type=str, help='JSON file of organize rules')
+    organize_parser.add_argument('--sniff', action='store_true', help='Classify files by content, not just by name')
     organize_parser.add_argument('--log-monitor', type=str, help='Log file to monitor')
+    organize_parser.add_argument('--follow', action='store_true', help='Only read log lines added since the last run')
 
     # Monitor system command
     monitor_parser = subparsers.add_parser('monitor')
@@ -86,9 +122,9 @@ def main():
 
     if args.command == 'organize':
         if args.dir:
-            organize_files(args.dir)
+            organize_files(args.dir, args.recursive, args.sniff, args.dedupe, args.stream, args.shard, args.rules)
         elif args.log_monitor:
-            monitor_log(args.log_monitor)
+            monitor_log(args.log_monitor, args.follow)
         else:
             logging.error("Please specify a directory to organize files in or a log file to monitor.")
     elif args.command == 'monitor':
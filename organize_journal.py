@@ -0,0 +1,180 @@
+import json
+import logging
+import os
+import time
+
+from organizer import Mover
+
+# -----------------------------
+# Organize Run Journal and Undo
+# -----------------------------
+
+DEFAULT_JOURNAL_DIR = os.path.expanduser("~/.local/state/sys_admin/organize")
+
+
+def new_run_id():
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+
+class OrganizeJournal:
+    """Append-only, write-ahead record of one organize run.
+
+    One JSON array per line: the header ["run", directory, dest, started],
+    then ["move", src, dst] intents, ["mkdir", path] for folders the run
+    created, ["dir", path] for directories whose files have all been moved,
+    ["end"] when the run finishes and ["undo"] once it has been reverted.
+    Intents are fsynced a batch at a time before any file in the batch is
+    moved, so every move that happened is in the journal.
+    """
+
+    def __init__(self, run_id, journal_dir=DEFAULT_JOURNAL_DIR):
+        self.run_id = run_id
+        self.path = os.path.join(journal_dir, f"{run_id}.journal")
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def _append(self, records):
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        if not lines:
+            return
+        with open(self.path, "a") as file:
+            file.write(lines)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def start(self, directory, dest=None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if self.exists():
+            raise ValueError(f"Organize run '{self.run_id}' already exists.")
+        self._append([["run", os.path.abspath(directory), dest and os.path.abspath(dest), time.time()]])
+
+    def record(self, moves, finished_dirs=(), created_dirs=()):
+        """Durably record (src, dst) intents, plus directories whose moves are all in earlier records.
+
+        created_dirs are the folders made for these moves that did not exist before the run.
+        """
+        abspath = os.path.abspath
+        self._append([["mkdir", abspath(path)] for path in created_dirs] +
+                     [["dir", abspath(path)] for path in finished_dirs] +
+                     [["move", abspath(src), abspath(dst)] for src, dst in moves])
+
+    def finish(self):
+        self._append([["end"]])
+
+    def mark_undone(self):
+        self._append([["undo"]])
+
+    def read(self):
+        """Return (header, moves, finished_dirs, created_dirs, state).
+
+        state is 'running', 'done' or 'undone'.
+        """
+        header, moves, finished_dirs, created_dirs, state = None, [], set(), [], "running"
+        with open(self.path, "r") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line from a crash mid-write; nothing after it was acted on
+                    break
+                kind = record[0]
+                if kind == "run":
+                    header = record
+                elif kind == "move":
+                    moves.append((record[1], record[2]))
+                elif kind == "dir":
+                    finished_dirs.add(record[1])
+                elif kind == "mkdir":
+                    created_dirs.append(record[1])
+                elif kind == "end":
+                    state = "done"
+                elif kind == "undo":
+                    state = "undone"
+        return header, moves, finished_dirs, created_dirs, state
+
+
+def _move_back(mover, src, dst):
+    """Move dst back to src; returns False when there is nothing (or not safely anything) to move."""
+    if not os.path.lexists(dst):
+        return False
+    if os.path.lexists(src):
+        logging.warning(f"Undo: '{src}' exists again, leaving '{dst}' in place.")
+        return False
+    os.makedirs(os.path.dirname(src), exist_ok=True)
+    mover.move(dst, os.path.dirname(src))
+    return True
+
+
+def redo_pending(journal, moves):
+    """Finish intents from an interrupted batch: moves whose source is still in place."""
+    redone = 0
+    with Mover() as mover:
+        for src, dst in moves:
+            if os.path.lexists(src) and not os.path.lexists(dst):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                mover.move(src, os.path.dirname(dst))
+                redone += 1
+    if redone:
+        logging.info(f"Resumed organize run '{journal.run_id}': finished {redone} interrupted moves.")
+    return redone
+
+
+def organize_journaled(organizer, directory, run_id=None, resume=False, journal_dir=DEFAULT_JOURNAL_DIR):
+    """Run organizer.organize under a journal; returns (run_id, files moved).
+
+    With resume, run_id names an interrupted run: its unfinished batch is
+    completed and directories it had finished are not listed for files again.
+    """
+    journal = OrganizeJournal(run_id or new_run_id(), journal_dir)
+    moved = 0
+    if resume:
+        if not journal.exists():
+            raise FileNotFoundError(f"No journal for organize run '{journal.run_id}'.")
+        _, moves, finished_dirs, _, state = journal.read()
+        if state != "running":
+            logging.info(f"Organize run '{journal.run_id}' is already {state}; nothing to resume.")
+            return journal.run_id, 0
+        moved += redo_pending(journal, moves)
+        organizer.finished_dirs = finished_dirs
+    else:
+        journal.start(directory, organizer.dest)
+    logging.info(f"Organize run '{journal.run_id}' journaled to {journal.path}.")
+
+    organizer.journal = journal
+    try:
+        moved += organizer.organize(directory)
+    finally:
+        organizer.journal = None
+    journal.finish()
+    return journal.run_id, moved
+
+
+def undo_run(run_id, journal_dir=DEFAULT_JOURNAL_DIR):
+    """Move every file of a run back, newest move first, and remove the empty folders it created."""
+    journal = OrganizeJournal(run_id, journal_dir)
+    if not journal.exists():
+        raise FileNotFoundError(f"No journal for organize run '{run_id}'.")
+    _, moves, _, created_dirs, state = journal.read()
+    if state == "undone":
+        logging.info(f"Organize run '{run_id}' was already undone.")
+        return 0
+
+    restored = 0
+    with Mover() as mover:
+        for src, dst in reversed(moves):
+            try:
+                if _move_back(mover, src, dst):
+                    restored += 1
+            except OSError as e:
+                logging.error(f"Undo: failed to move '{dst}' back to '{src}': {e}")
+    # Only folders the run created; directories that existed before it are never removed
+    for folder in sorted(set(created_dirs), key=lambda path: path.count(os.sep), reverse=True):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+    journal.mark_undone()
+    logging.info(f"Undid organize run '{run_id}': {restored} files moved back, "
+                 f"{mover.copied} of them across devices.")
+    return restored
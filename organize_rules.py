@@ -0,0 +1,180 @@
+import fnmatch
+import json
+import re
+import time
+
+import passwd_index
+
+# -----------------------------
+# Declarative Organize Rules
+# -----------------------------
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+RULE_KEYS = {"folder", "extensions", "glob", "regex", "min_size", "max_size", "older_than", "newer_than", "owner"}
+
+
+def parse_size(value):
+    """Bytes from an int or a string like '512K', '100M' or '2G'."""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+)\s*([KMGT]?)i?B?\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size '{value}'.")
+    return int(match.group(1)) * SIZE_UNITS[match.group(2).upper()]
+
+
+def parse_age(value):
+    """Seconds from an int or a string like '30d', '12h', '45m' or '2w'."""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*(\d+)\s*([smhdw]?)\s*", str(value))
+    if not match:
+        raise ValueError(f"Invalid age '{value}'.")
+    return int(match.group(1)) * AGE_UNITS[match.group(2) or "s"]
+
+
+def normalize_extension(extension):
+    """'TXT', 'txt' and '.txt' all become '.txt'; '' stays '' and matches files without an extension."""
+    extension = extension.lower()
+    return extension if not extension or extension.startswith(".") else f".{extension}"
+
+
+def resolve_owner(owner, root="/"):
+    if isinstance(owner, int) or str(owner).isdigit():
+        return int(owner)
+    fields = passwd_index.get_index(root).get_user(owner)
+    if fields is None:
+        raise ValueError(f"Unknown owner '{owner}' in organize rules.")
+    return int(fields[2])
+
+
+class Rule:
+    """One compiled rule: a target folder, an optional extension set, name pattern and stat predicates."""
+
+    def __init__(self, index, spec, now, root="/"):
+        unknown = set(spec) - RULE_KEYS
+        if unknown:
+            raise ValueError(f"Rule {index + 1}: unknown keys {sorted(unknown)}.")
+        if not spec.get("folder"):
+            raise ValueError(f"Rule {index + 1}: a folder is required.")
+        if "glob" in spec and "regex" in spec:
+            raise ValueError(f"Rule {index + 1}: use either glob or regex, not both.")
+        self.index = index
+        self.group = f"_r{index}"
+        self.folder = spec["folder"]
+        extensions = spec.get("extensions")
+        self.extensions = frozenset(normalize_extension(extension) for extension in extensions) if extensions else None
+        self.pattern = None
+        if "glob" in spec:
+            self.pattern = fnmatch.translate(spec["glob"])
+        elif "regex" in spec:
+            self.pattern = spec["regex"]
+        self.name_regex = re.compile(self.pattern) if self.pattern else None
+
+        # Stat checks, cheapest first; ages are turned into mtime bounds once
+        self.predicates = []
+        if "min_size" in spec:
+            minimum = parse_size(spec["min_size"])
+            self.predicates.append(lambda st: st.st_size >= minimum)
+        if "max_size" in spec:
+            maximum = parse_size(spec["max_size"])
+            self.predicates.append(lambda st: st.st_size <= maximum)
+        if "older_than" in spec:
+            before = now - parse_age(spec["older_than"])
+            self.predicates.append(lambda st: st.st_mtime < before)
+        if "newer_than" in spec:
+            after = now - parse_age(spec["newer_than"])
+            self.predicates.append(lambda st: st.st_mtime >= after)
+        if "owner" in spec:
+            uid = resolve_owner(spec["owner"], root)
+            self.predicates.append(lambda st: st.st_uid == uid)
+
+    def target(self, extension):
+        return self.folder.replace("{ext}", extension.lstrip(".") or "no_extension")
+
+
+class RuleSet:
+    """Rules compiled into a decision table; the first rule that matches a file wins.
+
+    Rules are a list of objects with a folder and any of extensions, glob,
+    regex (matched against the whole name), min_size, max_size, older_than,
+    newer_than and owner. A folder may contain '{ext}' for the file's own
+    extension. Evaluation is one dict lookup on the extension; files whose
+    candidate rules need more also get one match of a combined name regex,
+    then the stat predicates of the remaining candidates.
+    """
+
+    def __init__(self, specs, now=None, root="/"):
+        now = time.time() if now is None else now
+        self.rules = [Rule(index, spec, now, root) for index, spec in enumerate(specs)]
+
+        # Extension -> candidate rules in order; rules without extensions apply to every file
+        open_rules = tuple(rule for rule in self.rules if rule.extensions is None)
+        extensions = {extension for rule in self.rules if rule.extensions for extension in rule.extensions}
+        self.candidates = {
+            extension: tuple(rule for rule in self.rules if rule.extensions is None or extension in rule.extensions)
+            for extension in extensions
+        }
+        self.default_candidates = open_rules
+        # The common case: the first candidate needs nothing but the extension
+        self.direct = {extension: rules[0] for extension, rules in self.candidates.items()
+                       if rules and not rules[0].pattern and not rules[0].predicates}
+
+        patterned = [rule for rule in self.rules if rule.pattern]
+        self.combined = None
+        if patterned:
+            try:
+                self.combined = re.compile("|".join(f"(?P<{rule.group}>{rule.pattern})" for rule in patterned))
+            except re.error:
+                # Patterns that cannot be combined (e.g. numbered backreferences) are matched one by one
+                self.combined = None
+
+        self.literal_folders = {rule.folder.split("/")[0] for rule in self.rules if "{ext}" not in rule.folder}
+        self.folder_patterns = [re.compile(re.escape(rule.folder.split("/")[0]).replace(re.escape("{ext}"), ".+"))
+                                for rule in self.rules if "{ext}" in rule.folder.split("/")[0]]
+
+    @classmethod
+    def load(cls, path, root="/"):
+        """Load rules from a JSON file: either a list of rules or {"rules": [...]}."""
+        with open(path, "r") as file:
+            config = json.load(file)
+        specs = config.get("rules", []) if isinstance(config, dict) else config
+        return cls(specs, root=root)
+
+    def is_target(self, name):
+        return name in self.literal_folders or any(pattern.fullmatch(name) for pattern in self.folder_patterns)
+
+    def folder_for(self, entry, sniffed=None):
+        """Folder for a DirEntry-like object, or None when no rule matches."""
+        name = entry.name
+        if sniffed:
+            extension = sniffed
+        else:
+            dot = name.rfind(".")
+            extension = name[dot:].lower() if dot > 0 else ""
+        rule = self.direct.get(extension)
+        if rule is not None:
+            return rule.target(extension)
+
+        candidates = self.candidates.get(extension, self.default_candidates)
+        first_pattern_match = None
+        if self.combined is not None and any(rule.pattern for rule in candidates):
+            match = self.combined.fullmatch(name)
+            first_pattern_match = int(match.lastgroup[2:]) if match else len(self.rules)
+        st = None
+        for rule in candidates:
+            if rule.pattern:
+                # The combined regex reports the earliest pattern rule that matches the name
+                if first_pattern_match is None or rule.index > first_pattern_match:
+                    if not rule.name_regex.fullmatch(name):
+                        continue
+                elif rule.index < first_pattern_match:
+                    continue
+            if rule.predicates:
+                if st is None:
+                    st = entry.stat()
+                if not all(predicate(st) for predicate in rule.predicates):
+                    continue
+            return rule.target(extension)
+        return None
@@ -0,0 +1,379 @@
+import errno
+import logging
+import os
+import shutil
+import stat
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+# -----------------------------
+# File Organization Engine
+# -----------------------------
+
+# Category folders and the extensions that go into them
+FILE_TYPES = {
+    "text_files": (".txt",),
+    "log_files": (".log",),
+    "image_files": (".jpg", ".jpeg", ".png"),
+    "pdf_files": (".pdf",),
+}
+
+# Folder suffix used when files are sorted by their own extension
+EXTENSION_FOLDER_SUFFIX = "_files"
+
+DEFAULT_COPY_WORKERS = 4
+DEFAULT_BYTES_IN_FLIGHT = 256 << 20
+MOVE_BATCH_SIZE = 1000
+PROGRESS_INTERVAL = 5
+
+# Ways to split a type folder into subdirectories: by a hash of the name or by mtime
+SHARD_MODES = ("hash", "date")
+
+
+def extension_table(file_types=FILE_TYPES):
+    """Invert a folder -> extensions mapping into a lowercase extension -> folder table."""
+    return {extension.lower(): folder for folder, extensions in file_types.items() for extension in extensions}
+
+
+def missing_dirs(path):
+    """path and those of its parents that do not exist yet, deepest first."""
+    missing = []
+    while path and not os.path.isdir(path):
+        missing.append(path)
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return missing
+
+
+def copy_file(src, dst):
+    """Copy file contents in the kernel: copy_file_range, then sendfile, then a buffered copy."""
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        remaining = os.fstat(infd).st_size
+        for zero_copy in (os.copy_file_range, os.sendfile):
+            try:
+                while remaining > 0:
+                    if zero_copy is os.sendfile:
+                        copied = os.sendfile(outfd, infd, None, min(remaining, 1 << 30))
+                    else:
+                        copied = os.copy_file_range(infd, outfd, min(remaining, 1 << 30))
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                return
+            except OSError as e:
+                # Only fall through for "not supported here"; both file offsets have
+                # advanced, so the next method carries on where this one stopped
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
+
+
+class Mover:
+    """Moves files with a plain rename within a filesystem and a pooled copy across devices.
+
+    Each directory's device is looked up once. Cross-device copies run in a
+    thread pool and block new submissions once max_bytes_in_flight bytes are
+    being copied.
+    """
+
+    def __init__(self, workers=DEFAULT_COPY_WORKERS, max_bytes_in_flight=DEFAULT_BYTES_IN_FLIGHT):
+        self.workers = workers
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.devices = {}
+        self.pool = None
+        self.budget = threading.Condition()
+        self.in_flight = 0
+        self.renamed = 0
+        self.copied = 0
+        self.failed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def device(self, directory):
+        device = self.devices.get(directory)
+        if device is None:
+            device = self.devices[directory] = os.stat(directory).st_dev
+        return device
+
+    def move(self, src, target_dir):
+        """Move src into target_dir; cross-device moves may still be running on return."""
+        dst = os.path.join(target_dir, os.path.basename(src))
+        if self.device(os.path.dirname(src)) == self.device(target_dir):
+            os.rename(src, dst)
+            self.renamed += 1
+            return
+        size = os.stat(src).st_size
+        with self.budget:
+            # A file larger than the whole limit still goes through, on its own
+            while self.in_flight and self.in_flight + size > self.max_bytes_in_flight:
+                self.budget.wait()
+            self.in_flight += size
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.pool.submit(self._copy, src, dst, size)
+
+    def _copy(self, src, dst, size):
+        try:
+            copy_file(src, dst)
+            shutil.copystat(src, dst)
+            os.unlink(src)
+            with self.budget:
+                self.copied += 1
+        except OSError as e:
+            logging.error(f"Failed to move '{src}' to '{dst}': {e}")
+            try:
+                os.unlink(dst)
+            except OSError:
+                pass
+            with self.budget:
+                self.failed += 1
+        finally:
+            with self.budget:
+                self.in_flight -= size
+                self.budget.notify_all()
+
+    def close(self):
+        """Wait for every cross-device copy to finish."""
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+
+
+class OrganizeProgress:
+    """Counts scanned and moved files and logs the rate at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self):
+        self.scanned = 0
+        self.moved = 0
+        self.started = time.monotonic()
+        self.logged = self.started
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.logged < PROGRESS_INTERVAL:
+            return
+        self.logged = now
+        rate = self.moved / max(now - self.started, 1e-9)
+        logging.info(f"Organize: {self.scanned} entries scanned, {self.moved} files moved ({rate:.0f} files/s).")
+
+
+class PathEntry:
+    """The parts of os.DirEntry the organizer uses, for a single path known by name."""
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+
+    def stat(self):
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def is_file(self):
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+class Organizer:
+    """Sorts the files of a directory into per-type folders.
+
+    With a file_types table, files go to the folder of their extension and
+    unknown extensions stay put. Without one, every file goes to an
+    '<extension>_files' folder named after its own extension. A classifier,
+    when given, lets the file's first bytes override its name. With a
+    journal, each batch of moves is recorded before it is carried out, and
+    directories listed in finished_dirs (from a resumed run) are not
+    organized again.
+
+    With stream, directories are read lazily while their files are moved, so
+    memory stays flat however many entries a directory has. shard splits
+    each type folder into subdirectories: 'hash' gives 256 folders named
+    after a hash of the file name, 'date' gives YYYY/MM of the file's mtime.
+    A compiled organize_rules.RuleSet, when given, replaces file_types.
+    """
+
+    def __init__(self, file_types=None, recursive=False, dest=None,
+                 copy_workers=DEFAULT_COPY_WORKERS, max_bytes_in_flight=DEFAULT_BYTES_IN_FLIGHT,
+                 classifier=None, journal=None, batch_size=MOVE_BATCH_SIZE, stream=False, shard=None,
+                 rules=None):
+        if shard not in (None, *SHARD_MODES):
+            raise ValueError(f"Unknown shard mode '{shard}'.")
+        self.table = extension_table(file_types) if file_types else None
+        self.folders = frozenset(file_types) if file_types else None
+        self.recursive = recursive
+        self.dest = dest
+        self.copy_workers = copy_workers
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.classifier = classifier
+        self.target_dirs = set()  # every folder files were moved into
+        self.journal = journal
+        self.batch_size = batch_size
+        self.finished_dirs = set()  # absolute paths
+        self.stream = stream
+        self.shard = shard
+        self.progress = OrganizeProgress()
+        self.rules = rules
+
+    def folder_for(self, name, sniffed=None):
+        """Folder for a file name; sniffed is an extension found from the file's content."""
+        if self.table is None:
+            extension = sniffed[1:] if sniffed else name.split('.')[-1]
+            return f"{extension}{EXTENSION_FOLDER_SUFFIX}"
+        if sniffed:
+            return self.table.get(sniffed)
+        dot = name.rfind(".")
+        return self.table.get(name[dot:].lower()) if dot >= 0 else None
+
+    def is_target(self, name):
+        """True for folders this organizer sorts files into; they are never descended into."""
+        if self.rules is not None:
+            return self.rules.is_target(name)
+        if self.folders is None:
+            return name.endswith(EXTENSION_FOLDER_SUFFIX)
+        return name in self.folders
+
+    def type_folders(self, directory):
+        """Yield the paths of the folders this organizer sorts into under directory."""
+        pending = [directory]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if self.is_target(entry.name):
+                        yield entry.path
+                    elif self.recursive:
+                        pending.append(entry.path)
+
+    def shard_for(self, entry):
+        """Subdirectory of the type folder for a file, or '' without sharding."""
+        if self.shard == "hash":
+            return f"{zlib.crc32(os.fsencode(entry.name)) & 0xff:02x}"
+        if self.shard == "date":
+            modified = time.localtime(entry.stat().st_mtime)
+            return os.path.join(f"{modified.tm_year}", f"{modified.tm_mon:02d}")
+        return ""
+
+    def classify(self, entry):
+        """Folder for a file entry, looking at its content when a classifier is set."""
+        try:
+            sniffed = self.classifier.sniff(entry) if self.classifier else None
+        except OSError as e:
+            logging.warning(f"Could not read '{entry.path}', classifying by name: {e}")
+            sniffed = None
+        if self.rules is not None:
+            return self.rules.folder_for(entry, sniffed)
+        return self.folder_for(entry.name, sniffed)
+
+    def scan(self, directory):
+        """Yield (entry, folder) for every file to move, one scandir pass per directory.
+
+        Only the entries of the directory being processed (none in stream
+        mode) and the paths of subdirectories still to visit are held in memory.
+        """
+        skip = os.path.realpath(self.dest) if self.dest else None
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            finished = os.path.abspath(path) in self.finished_dirs
+            with os.scandir(path) as iterator:
+                # Without stream, a directory is read in full before any of its files moves.
+                # Streaming is safe too: only entries already returned are removed, and the
+                # only entries added are type folders, which are skipped
+                yield from self._scan_entries(iterator if self.stream else list(iterator), finished, skip, pending)
+
+    def _scan_entries(self, entries, finished, skip, pending):
+        progress = self.progress
+        for entry in entries:
+            progress.scanned += 1
+            if not progress.scanned & 0xfff:
+                progress.report()
+            if entry.is_file():
+                if finished:
+                    continue
+                folder = self.classify(entry)
+                if folder:
+                    yield entry, folder
+            elif self.recursive and entry.is_dir(follow_symlinks=False) and not self.is_target(entry.name):
+                if skip is None or os.path.realpath(entry.path) != skip:
+                    pending.append(entry.path)
+
+    def _move_batch(self, mover, batch, finished, new_dirs):
+        if self.journal:
+            self.journal.record([(src, os.path.join(target_dir, os.path.basename(src))) for src, target_dir in batch],
+                                finished, new_dirs)
+        new_dirs.clear()
+        for src, target_dir in batch:
+            try:
+                mover.move(src, target_dir)
+            except OSError as e:
+                logging.error(f"Failed to move '{src}' to '{target_dir}': {e}")
+                mover.failed += 1
+        self.progress.moved += len(batch)
+        self.progress.report()
+        batch.clear()
+        finished.clear()
+
+    def organize(self, directory, entries=None):
+        """Move every file into its folder and return the number of files moved.
+
+        Folders are created next to each file, or under dest mirroring the
+        directory layout when a destination is given. entries, when given, are
+        the (entry, folder) pairs to move instead of a scan of the directory.
+        """
+        created = set()
+        batch = []
+        finished = []  # directories all of whose moves are in the current or earlier batches
+        new_dirs = []  # folders created for the current batch, journaled so undo removes only those
+        current = None
+        with Mover(self.copy_workers, self.max_bytes_in_flight) as mover:
+            for entry, folder in self.scan(directory) if entries is None else entries:
+                source_dir = os.path.dirname(entry.path)
+                if source_dir != current:
+                    if current is not None:
+                        finished.append(current)
+                    current = source_dir
+                parent = source_dir
+                if self.dest:
+                    parent = os.path.join(self.dest, os.path.relpath(parent, directory))
+                target_dir = os.path.join(parent, folder, self.shard_for(entry)) if self.shard else \
+                    os.path.join(parent, folder)
+                if target_dir not in created:
+                    if self.journal:
+                        new_dirs += missing_dirs(target_dir)
+                    os.makedirs(target_dir, exist_ok=True)
+                    created.add(target_dir)
+                    self.target_dirs.add(target_dir)
+                batch.append((entry.path, target_dir))
+                if len(batch) >= self.batch_size:
+                    self._move_batch(mover, batch, finished, new_dirs)
+            if current is not None:
+                finished.append(current)
+            self._move_batch(mover, batch, finished, new_dirs)
+        if self.progress.moved >= self.batch_size:
+            self.progress.report(force=True)
+        if mover.copied or mover.failed:
+            logging.info(f"{mover.renamed} files renamed, {mover.copied} copied across devices, "
+                         f"{mover.failed} failed.")
+        if self.classifier:
+            self.classifier.save()
+        return mover.renamed + mover.copied
+
+
+def organize_files(directory, file_types=FILE_TYPES, recursive=False, dest=None, classifier=None):
+    """Organize a directory by file type; pass file_types=None to sort by each file's own extension."""
+    moved = Organizer(file_types, recursive, dest, classifier=classifier).organize(directory)
+    logging.info(f"Moved {moved} files in {directory} into type folders.")
+    return moved
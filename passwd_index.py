@@ -0,0 +1,101 @@
+import os
+
+# -----------------------------
+# Shared passwd/group Index
+# -----------------------------
+
+
+class PasswdIndex:
+    """Name and ID lookups over etc/passwd and etc/group, reloaded only when the files change."""
+
+    def __init__(self, root="/"):
+        self.root = root
+        self.passwd_path = os.path.join(root, "etc", "passwd")
+        self.group_path = os.path.join(root, "etc", "group")
+        self.users_by_name = {}
+        self.users_by_uid = {}
+        self.groups_by_name = {}
+        self.groups_by_gid = {}
+        self._signatures = {}
+
+    def _signature(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _load(self, path):
+        entries = {}
+        by_id = {}
+        try:
+            with open(path, "r") as file:
+                for line in file:
+                    fields = line.rstrip("\n").split(":")
+                    if len(fields) < 4 or not fields[2].isdigit():
+                        continue
+                    entries[fields[0]] = fields
+                    by_id.setdefault(int(fields[2]), fields)
+        except FileNotFoundError:
+            pass
+        return entries, by_id
+
+    def refresh(self):
+        """Re-read passwd or group only if its inode or mtime changed since the last load."""
+        signature = self._signature(self.passwd_path)
+        if signature is None or signature != self._signatures.get("passwd"):
+            self.users_by_name, self.users_by_uid = self._load(self.passwd_path)
+            self._signatures["passwd"] = signature
+        signature = self._signature(self.group_path)
+        if signature is None or signature != self._signatures.get("group"):
+            self.groups_by_name, self.groups_by_gid = self._load(self.group_path)
+            self._signatures["group"] = signature
+
+    def user_exists(self, username) -> bool:
+        self.refresh()
+        return username in self.users_by_name
+
+    def users_exist(self, usernames) -> dict:
+        """Check many usernames against one parse of passwd."""
+        self.refresh()
+        return {username: username in self.users_by_name for username in usernames}
+
+    def uid_exists(self, uid) -> bool:
+        self.refresh()
+        return int(uid) in self.users_by_uid
+
+    def get_user(self, username):
+        """Return the passwd fields for a user, or None."""
+        self.refresh()
+        return self.users_by_name.get(username)
+
+    def get_group(self, group):
+        """Return the group fields for a group, or None."""
+        self.refresh()
+        return self.groups_by_name.get(group)
+
+    def group_members(self, group) -> list:
+        fields = self.get_group(group)
+        if fields is None:
+            return []
+        return [member for member in fields[3].split(",") if member]
+
+
+_indexes = {}
+
+
+def get_index(root="/") -> PasswdIndex:
+    """Return the shared index for a root prefix."""
+    if root not in _indexes:
+        _indexes[root] = PasswdIndex(root)
+    return _indexes[root]
+
+
+def user_exists(username, root="/") -> bool:
+    """Check if a user exists in the local passwd file."""
+    return get_index(root).user_exists(username)
+
+
+def users_exist(usernames, root="/") -> dict:
+    """Map each username to whether it exists in the local passwd file."""
+    return get_index(root).users_exist(usernames)
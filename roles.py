@@ -0,0 +1,105 @@
+import logging
+
+import user_db
+
+# -----------------------------
+# Role to Group Mapping
+# -----------------------------
+
+# Supplementary groups that make up each role
+ROLE_GROUPS = {
+    "admin": ("sudo",),
+    "user": (),
+}
+
+
+def role_groups(admin_group="sudo"):
+    """Role mapping for scripts that grant admin rights through a different group."""
+    return {"admin": (admin_group,), "user": ()}
+
+
+def role_commands(username, role, groups=ROLE_GROUPS, downgrade=False, sudo=False):
+    """usermod/gpasswd commands that give one existing user its role's groups.
+
+    For single-user changes in scripts that run every other account command
+    through the system tools (and sudo), so the role step needs no more
+    privilege than useradd. With downgrade, the groups of other roles are left too.
+    """
+    if role not in groups:
+        raise ValueError(f"Invalid role '{role}' for user '{username}'.")
+    prefix = ["sudo"] if sudo else []
+    wanted = groups[role]
+    commands = []
+    if wanted:
+        commands.append([*prefix, "usermod", "-aG", ",".join(wanted), username])
+    if downgrade:
+        others = dict.fromkeys(group for names in groups.values() for group in names if group not in wanted)
+        commands += [[*prefix, "gpasswd", "-d", username, group] for group in others]
+    return commands
+
+
+def role_of(db, username, groups=ROLE_GROUPS):
+    """Return the first role whose groups the user is in, defaulting to 'user'."""
+    member_of = db.user_groups(username)
+    for role, role_group_names in groups.items():
+        if role_group_names and all(group in member_of for group in role_group_names):
+            return role
+    return "user"
+
+
+class MembershipChanges:
+    """Collects group membership changes for a batch and applies them per group at once."""
+
+    def __init__(self, groups=ROLE_GROUPS):
+        self.groups = groups
+        self.additions = {}  # group -> {username: None}, kept in insertion order
+        self.removals = {}
+
+    def __len__(self):
+        return sum(len(users) for users in self.additions.values()) + \
+            sum(len(users) for users in self.removals.values())
+
+    def add(self, username, group):
+        self.removals.get(group, {}).pop(username, None)
+        self.additions.setdefault(group, {})[username] = None
+
+    def remove(self, username, group):
+        self.additions.get(group, {}).pop(username, None)
+        self.removals.setdefault(group, {})[username] = None
+
+    def assign_role(self, username, role):
+        """Join the role's groups and leave the groups of every other role."""
+        if role not in self.groups:
+            raise ValueError(f"Invalid role '{role}' for user '{username}'.")
+        wanted = set(self.groups[role])
+        for group_names in self.groups.values():
+            for group in group_names:
+                if group not in wanted:
+                    self.remove(username, group)
+        for group in self.groups[role]:
+            self.add(username, group)
+
+    def apply_to(self, db):
+        """Apply every change to an already locked UserDatabase."""
+        for group in dict.fromkeys([*self.additions, *self.removals]):
+            if group not in db.groups:
+                logging.error(f"Group '{group}' does not exist. Skipping its membership changes.")
+                continue
+            # Users deleted later in the same batch must not be added back
+            add = [username for username in self.additions.get(group, ()) if db.user_exists(username)]
+            db.update_group_members(group, add=add, remove=list(self.removals.get(group, ())))
+
+    def apply(self, root="/"):
+        """Apply every change with one rewrite of the group files."""
+        db = user_db.UserDatabase(root)
+        with db.lock():
+            self.apply_to(db)
+        logging.info(f"Applied {len(self)} group membership changes under '{root}'.")
+
+
+def assign_roles(assignments, root="/", groups=ROLE_GROUPS):
+    """Give each (username, role) its role's groups with one rewrite of the group files."""
+    changes = MembershipChanges(groups)
+    for username, role in assignments:
+        changes.assign_role(username, role)
+    changes.apply(root)
@@ -2,11 +2,17 @@
 import argparse
 import sys
 import crypt
-import pwd
-import subprocess
-import csv
 import logging
 
+import passwd_index
+from csv_journal import CheckpointJournal, batched, stream_csv
+from csv_validate import preflight
+from hash_pool import hash_rows
+from user_db import provision_users
+from home_reclaim import reclaim_home
+from roles import role_commands
+from user_executor import run_commands
+
 # Set up logging
 logging.basicConfig(
     filename="sys_admin.log", #change to your file name or make same one
@@ -16,13 +22,7 @@ logging.basicConfig(
 
 
 def user_exists(username) -> bool:
-    try:
-        pwd.getpwnam(username)
-        logging.info(f"Checked existence of user '{username}': EXISTS.")
-        return True
-    except KeyError:
-        logging.info(f"Checked existence of user '{username}': DOES NOT EXIST.")
-        return False
+    return passwd_index.user_exists(username)
 
 
 def main():
@@ -43,6 +43,8 @@ def main():
 
     batch_parser = subparsers.add_parser("create_batch", help="Create users from CSV")
     batch_parser.add_argument("-f", "--filename", type=str, action="store", help="Name of CSV file")
+    batch_parser.add_argument("--resume", action="store_true", help="Resume from the checkpoint journal")
+    batch_parser.add_argument("--from-row", type=int, default=None, help="Start at this CSV data row (1-based)")
 
     delete_parser = subparsers.add_parser("delete", help="Delete existing user")
     delete_parser.add_argument("-u", "--username", type=str, action="store", help="Assign username")
@@ -70,7 +72,7 @@ def main():
             if not args.filename:
                 print("You must include the filename.")
             else:
-                create_from_csv(args.filename)
+                create_from_csv(args.filename, resume=args.resume, from_row=args.from_row)
 
         if "delete" in args:
             if not args.username:
@@ -95,11 +97,16 @@ def create_user(username: str, password: str, role: str):
     if user_exists(username):
         logging.warning(f"Cannot create user '{username}': Already exists.")
     try:
-        subprocess.call(["useradd", "-p", en_pwd, username])
-        logging.info(f"User '{username}' created successfully.")
+        commands = [["useradd", "-p", en_pwd, username]]
         if role == "admin":
-            subprocess.call(["usermod", "-g", "root", username])
-            logging.info(f"Granted root access to user '{username}'.")
+            commands.append(["usermod", "-g", "root", username])
+        row = run_commands(username, commands)
+        if row.ok:
+            logging.info(f"User '{username}' created successfully.")
+            if role == "admin":
+                logging.info(f"Granted root access to user '{username}'.")
+        else:
+            logging.error(f"Error creating user '{username}': {row.error()}")
     except Exception as e:
         logging.error(f"Error creating user '{username}': {e}")
 
@@ -109,31 +116,35 @@ def create_user_two(username: str, role: str, password: str):
         logging.warning(f"User '{username}' exists. Skipping creation.")
     else:
         en_pwd = crypt.crypt(password)
-
-        subprocess.call(["useradd", "-p", en_pwd, username])
-        # if role == "admin":
-        #     subprocess.call(["usermod", "-g", "root", username])
-
         try:
-            subprocess.call(["useradd", "-p", en_pwd, username])
-            logging.info(f"User '{username}' created successfully.")
+            commands = [["useradd", "-p", en_pwd, username]]
             if role == "admin":
-                subprocess.call(["usermod", "-g", "root", username])
-            # if role.lower() == "admin":
-            #     subprocess.call(["usermod", "-aG", "root", username])
-                logging.info(f"Granted admin privileges to user '{username}'.")
+                commands.append(["usermod", "-g", "root", username])
+            row = run_commands(username, commands)
+            if row.ok:
+                logging.info(f"User '{username}' created successfully.")
+                if role == "admin":
+                    logging.info(f"Granted admin privileges to user '{username}'.")
+            else:
+                logging.error(f"Error creating user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Error creating user '{username}': {e}")
 
 
-def create_from_csv(filename):
-    """Create users in batch from a CSV file."""
+def create_from_csv(filename, root="/", resume=False, from_row=None):
+    """Create users in batch from a CSV file, journaling each committed chunk."""
     try:
-        with open(filename, "r") as fPtr:
-            reader = csv.reader(fPtr)
-            next(reader)  # Skip header row
-            for row in reader:
-                create_user_two(row[0], row[1], row[2])
+        # Validate the whole file before any account is created
+        if not preflight(filename, root, ignore_role_case=True):
+            return
+        journal = CheckpointJournal(f"{filename}.journal")
+        with open(filename, "rb") as fPtr:
+            records = stream_csv(fPtr, journal, resume=resume, from_row=from_row)
+            rows = hash_rows((r.fields["username"], r.fields["role"].lower(), r.fields["password"], r)
+                             for r in records)
+            for chunk in batched(rows):
+                provision_users([row[:3] for row in chunk], root=root, admin_group="root", create_homes=False)
+                journal.record(row[3] for row in chunk)
         logging.info(f"Batch creation from '{filename}' completed successfully.")
     except FileNotFoundError:
         logging.error(f"CSV file '{filename}' not found.")
@@ -144,8 +155,13 @@ def create_from_csv(filename):
 def deletes_user(username: str):
     if user_exists(username):
         try:
-            subprocess.call(["userdel", "-r", username])
-            logging.info(f"User '{username}' deleted successfully.")
+            home = passwd_index.get_index().get_user(username)[5]
+            row = run_commands(username, [["userdel", username]])
+            if row.ok:
+                reclaim_home(username, home)
+                logging.info(f"User '{username}' deleted successfully.")
+            else:
+                logging.error(f"Failed to delete user '{username}': {row.error()}")
         except Exception as e:
             logging.error(f"Failed to delete user '{username}': {e}")
     else:
@@ -166,14 +182,21 @@ def modify_user(old_username: str, new_username: str, new_password: str, new_rol
     #     if new_role is not None:
     #         subprocess.call(["usermod", "-g", "root", old_username])
     if user_exists(old_username):
+        commands = []
         if new_role == "admin":
-            subprocess.call(["usermod", "-g", "root", old_username])
+            commands.append(["usermod", "-g", "root", old_username])
         if new_role == "user":
-            subprocess.call(["deluser", old_username, "sudo"])
+            commands += role_commands(old_username, "user", downgrade=True)
         if new_password is not None:
-            subprocess.call(["usermod", "-p", new_password, old_username])
+            commands.append(["usermod", "-p", new_password, old_username])
         if new_username is not None:
-            subprocess.call(["usermod", "-l", new_username, old_username])
+            commands.append(["usermod", "-l", new_username, old_username])
+        # The rename runs last, so the earlier commands still see the old name
+        row = run_commands(old_username, commands, stop_on_error=False)
+        if row.ok:
+            logging.info(f"User '{old_username}' modified successfully.")
+        else:
+            logging.error(f"Failed to modify user '{old_username}': exit codes {row.returncodes}")
 
 
 if __name__ == '__main__':
@@ -1,53 +1,39 @@
-import os
-import shutil
 import argparse
 import logging
 
+from file_classifier import FileClassifier
+from log_scan import LogScanner
+from log_summary import DEFAULT_SUMMARY_FILE, ErrorSummary
+from organize_rules import RuleSet
+from organizer import FILE_TYPES, Organizer
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-def organize_files(directory):
+def organize_files(directory, recursive=False, sniff=False, rules_file=None):
     logging.info(f'Organizing files in {directory} by type')
-    
-    # Define file type directories
-    file_types = {
-        'text_files': ['.txt'],
-        'log_files': ['.log'],
-        'image_files': ['.jpg', '.jpeg', '.png'],
-        'pdf_files': ['.pdf'],
-    }
-
-    # Create directories for each file type
-    for folder, extensions in file_types.items():
-        folder_path = os.path.join(directory, folder)
-        os.makedirs(folder_path, exist_ok=True)
 
-        # Move files to the corresponding directory
-        for filename in os.listdir(directory):
-            if any(filename.endswith(ext) for ext in extensions):
-                src_path = os.path.join(directory, filename)
-                dest_path = os.path.join(folder_path, filename)
-                shutil.move(src_path, dest_path)
-                logging.info(f'Moved {filename} to {folder_path}')
+    # One pass over the directory; each file's folder comes from the extension table
+    classifier = FileClassifier() if sniff else None
+    # A rules file replaces the built-in file type table
+    rules = RuleSet.load(rules_file) if rules_file else None
+    moved = Organizer(FILE_TYPES, recursive, classifier=classifier, rules=rules).organize(directory)
 
-    logging.info('Directory organization complete.')
+    logging.info(f'Directory organization complete. Moved {moved} files.')
 
 def monitor_logs(log_file):
     logging.info(f'Monitoring {log_file} for critical messages')
     
-    critical_messages = []
-    with open(log_file, 'r') as file:
-        for line in file:
-            if "Error" in line or "Critical" in line:
-                critical_messages.append(line.strip())
-                logging.warning(f'Critical message found: "{line.strip()}"')
+    summary = ErrorSummary()
+    for _, line in LogScanner(['Error', 'Critical'], ignore_case=False).scan_path(log_file):
+        line = line.decode(errors='replace')
+        summary.add(line)
+        logging.warning(f'Critical message found: "{line.strip()}"')
 
-    # Log critical messages to a summary file
-    if critical_messages:
-        with open('error_summary.log', 'w') as summary_file:
-            for message in critical_messages:
-                summary_file.write(message + '\n')
-        logging.info('Logged critical messages to error_summary.log.')
+    # Log critical messages to a summary file, one line per message template with its count
+    if summary.total:
+        summary.write(DEFAULT_SUMMARY_FILE)
+        logging.info(f'Logged {summary.total} critical messages to {DEFAULT_SUMMARY_FILE}.')
 
 def main():
     parser = argparse.ArgumentParser(description='System Administration Script')
@@ -56,13 +42,16 @@ def main():
     # Directory organization command
     organize_parser = subparsers.add_parser('organize')
     organize_parser.add_argument('--dir', type=str, help='Directory to organize')
+    organize_parser.add_argument('--recursive', action='store_true', help='Also organize every subdirectory')
+    organize_parser.add_argument('--rules', type=str, help='JSON file of organize rules')
+    organize_parser.add_argument('--sniff', action='store_true', help='Classify files by content, not just by name')
     organize_parser.add_argument('--log-monitor', type=str, help='Log file to monitor')
 
     args = parser.parse_args()
 
     if args.command == 'organize':
         if args.dir:
-            organize_files(args.dir)
+            organize_files(args.dir, args.recursive, args.sniff, args.rules)
         if args.log_monitor:
             monitor_logs(args.log_monitor)
 
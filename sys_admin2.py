@@ -1,35 +1,25 @@
-import os
-import shutil
 import argparse
 import logging
+
+from file_classifier import FileClassifier
+from organize_rules import RuleSet
+from organizer import FILE_TYPES, Organizer
 import psutil
 import time
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
-def organize_files(directory):
+def organize_files(directory, recursive=False, sniff=False, rules_file=None):
     logging.info(f'Organizing files in {directory} by type')
-    
-    file_types = {
-        'text_files': ['.txt'],
-        'log_files': ['.log'],
-        'image_files': ['.jpg', '.jpeg', '.png'],
-        'pdf_files': ['.pdf'],
-    }
-
-    for folder, extensions in file_types.items():
-        folder_path = os.path.join(directory, folder)
-        os.makedirs(folder_path, exist_ok=True)
 
-        for filename in os.listdir(directory):
-            if any(filename.endswith(ext) for ext in extensions):
-                src_path = os.path.join(directory, filename)
-                dest_path = os.path.join(folder_path, filename)
-                shutil.move(src_path, dest_path)
-                logging.info(f'Moved {filename} to {folder_path}')
+    # One pass over the directory; each file's folder comes from the extension table
+    classifier = FileClassifier() if sniff else None
+    # A rules file replaces the built-in file type table
+    rules = RuleSet.load(rules_file) if rules_file else None
+    moved = Organizer(FILE_TYPES, recursive, classifier=classifier, rules=rules).organize(directory)
 
-    logging.info('Directory organization complete.')
+    logging.info(f'Directory organization complete. Moved {moved} files.')
 
 def monitor_system():
     logging.info('System health check every 1 minute for 10 minutes')
@@ -63,6 +53,9 @@ def main():
     # Directory organization command
     organize_parser = subparsers.add_parser('organize')
     organize_parser.add_argument('--dir', type=str, help='Directory to organize')
+    organize_parser.add_argument('--recursive', action='store_true', help='Also organize every subdirectory')
+    organize_parser.add_argument('--rules', type=str, help='JSON file of organize rules')
+    organize_parser.add_argument('--sniff', action='store_true', help='Classify files by content, not just by name')
     organize_parser.add_argument('--log-monitor', type=str, help='Log file to monitor')
 
     # System health monitoring command
@@ -76,7 +69,7 @@ def main():
 
     if args.command == 'organize':
         if args.dir:
-            organize_files(args.dir)
+            organize_files(args.dir, args.recursive, args.sniff, args.rules)
         if args.log_monitor:
             monitor_logs(args.log_monitor)
 
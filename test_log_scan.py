@@ -0,0 +1,43 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from log_scan import LogScanner, bounded_map, parallel_scan
+
+LOG = b"boot ok\nCRITICAL disk failure\nwarning: no critical here\nfull disk\ndisk full\n"
+
+
+def matching(scanner, data=LOG):
+    return [line for _, line in scanner.scan(io.BytesIO(data))]
+
+
+def test_anchored_regexes_match_at_every_line():
+    assert matching(LogScanner((), [r"^CRITICAL"])) == [b"CRITICAL disk failure"]
+    assert matching(LogScanner((), [r"disk$"])) == [b"full disk"]
+
+
+def test_keywords_and_regexes_report_each_line_once():
+    scanner = LogScanner(["critical"], [r"^full"])
+    assert matching(scanner) == [b"CRITICAL disk failure", b"warning: no critical here", b"full disk"]
+
+
+def test_bounded_map_keeps_order_and_limits_submitted_tasks():
+    taken = []
+
+    def tasks():
+        for task in range(10):
+            taken.append(task)
+            yield task
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = bounded_map(pool, lambda task: task * task, tasks(), 3)
+        assert next(results) == 0
+        assert len(taken) <= 4
+        assert list(results) == [task * task for task in range(1, 10)]
+
+
+def test_parallel_scan_matches_serial_scan(tmp_path):
+    path = tmp_path / "big.log"
+    path.write_bytes(LOG * 200)
+    scanner = LogScanner(["critical"], [r"disk$"])
+    expected = list(scanner.scan_path(str(path)))
+    assert list(parallel_scan(str(path), scanner, workers=2, chunk_size=1000)) == expected
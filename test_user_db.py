@@ -0,0 +1,49 @@
+import pytest
+
+from user_db import UserDatabase, provision_users
+
+
+def write_etc(root, **files):
+    etc = root / "etc"
+    etc.mkdir()
+    for name in ("passwd", "shadow", "group", "gshadow"):
+        (etc / name).write_text(files.get(name, ""))
+    return etc
+
+
+def test_user_named_after_existing_group_is_refused(tmp_path):
+    etc = write_etc(tmp_path, group="alice:x:1500:bob,carol\n", gshadow="alice:!::bob,carol\n")
+
+    db = UserDatabase(str(tmp_path))
+    with db.lock():
+        with pytest.raises(ValueError):
+            db.add_user("alice", "!")
+
+    assert provision_users([("alice", "user", "!"), ("dave", "user", "!")],
+                           root=str(tmp_path), create_homes=False) == ["dave"]
+    groups = [line for line in (etc / "group").read_text().splitlines() if line.startswith("alice:")]
+    assert groups == ["alice:x:1500:bob,carol"]
+    assert "alice:" not in (etc / "passwd").read_text()
+
+
+def test_malformed_and_duplicate_lines_are_kept_as_they_are(tmp_path):
+    passwd = ("root:x:0:0:root:/root:/bin/bash\n"
+              "+::::::\n"
+              "broken:x:notanumber:1000::/home/broken:/bin/bash\n"
+              "\n"
+              "bob:x:1001:1001::/home/bob:/bin/bash\n"
+              "bob:x:1002:1002::/home/bob2:/bin/bash\n"
+              "carol:x:1003:1003::/home/carol:/bin/bash\n")
+    etc = write_etc(tmp_path, passwd=passwd, group="short:x\nbob:x:1001:\ncarol:x:1003:\n",
+                    shadow="bob:!:1:0:99999:7:::\ncarol:!:1:0:99999:7:::\n")
+
+    db = UserDatabase(str(tmp_path))
+    with db.lock():
+        assert db.users["bob"][2] == "1001"
+        db.add_user("dave", "!")
+        db.delete_user("carol")
+
+    assert (etc / "passwd").read_text() == passwd.replace("carol:x:1003:1003::/home/carol:/bin/bash\n", "") + \
+        f"dave:x:{db.users['dave'][2]}:{db.users['dave'][3]}::/home/dave:/bin/bash\n"
+    assert (etc / "group").read_text().startswith("short:x\nbob:x:1001:\n")
+    assert "carol" not in (etc / "group").read_text()
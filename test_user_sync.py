@@ -0,0 +1,32 @@
+import pytest
+
+from user_sync import build_plan
+
+PASSWD = "root:x:0:0::/root:/bin/bash\nalice:x:1000:1000::/home/alice:/bin/bash\nbob:x:1001:1001::/home/bob:/bin/bash\n"
+
+
+def make_root(tmp_path, csv_text):
+    etc = tmp_path / "etc"
+    etc.mkdir()
+    (etc / "passwd").write_text(PASSWD)
+    (etc / "shadow").write_text("root:!:::::::\nalice:!:::::::\nbob:!:::::::\n")
+    (etc / "group").write_text("root:x:0:\nalice:x:1000:\nbob:x:1001:\n")
+    (etc / "gshadow").write_text("root:!::\nalice:!::\nbob:!::\n")
+    csv_file = tmp_path / "users.csv"
+    csv_file.write_text(csv_text)
+    return str(tmp_path), str(csv_file)
+
+
+def test_invalid_usernames_stop_the_plan(tmp_path):
+    root, csv_file = make_root(tmp_path, "username,role,password\nbad:name,user,secret99\n")
+    with pytest.raises(ValueError, match="Invalid username"):
+        build_plan(csv_file, root, workers=1)
+
+
+def test_missing_accounts_are_only_deleted_on_request(tmp_path):
+    root, csv_file = make_root(tmp_path, "username,role,password\ncarol,user,secret99\n")
+    plan = build_plan(csv_file, root, workers=1)
+    assert plan.deletions == [] and plan.kept == ["alice", "bob"]
+
+    plan = build_plan(csv_file, root, workers=1, delete=True, keep={"alice"})
+    assert plan.deletions == ["bob"] and plan.kept == ["alice"]
@@ -0,0 +1,201 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+import passwd_index
+from csv_validate import USERNAME_PATTERN
+from hash_pool import hash_password
+from home_provision import provision_homes
+from home_reclaim import reclaim_home, start_reclaimer
+from roles import MembershipChanges, role_groups
+from user_db import UserDatabase, home_entry
+from user_sync import is_managed
+
+# -----------------------------
+# User Management Daemon
+# -----------------------------
+
+DEFAULT_SOCKET = "/run/sys_admin.sock"
+BATCH_WINDOW = 0.05
+MAX_BATCH = 1000
+VALID_ROLES = ("admin", "user")
+
+
+class UserDaemon:
+    """Serves user operations over a UNIX socket and applies them in coalesced batches.
+
+    The protocol is one JSON object per line in each direction. Requests look like
+    {"op": "create", "username": "alice", "role": "admin", "password": "..."};
+    the ops are create, update, delete and exists.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, root="/", admin_group="sudo",
+                 workers=None, rounds=None, window=BATCH_WINDOW):
+        self.socket_path = socket_path
+        self.root = root
+        self.admin_group = admin_group
+        self.rounds = rounds
+        self.window = window
+        self.index = passwd_index.get_index(root)
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.queue = None
+
+    async def serve(self):
+        self.queue = asyncio.Queue()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        logging.info(f"User daemon listening on {self.socket_path}")
+        batcher = asyncio.create_task(self.batcher())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            self.pool.shutdown()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.dispatch(json.loads(line))
+                except ValueError as e:
+                    response = {"ok": False, "message": f"[ERROR] Bad request: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        if not isinstance(request, dict):
+            return {"ok": False, "message": "[ERROR] Bad request: expected a JSON object."}
+        op = request.get("op")
+        username = request.get("username")
+        if not username:
+            return {"ok": False, "message": "[ERROR] A username is required."}
+        # Names go straight into the account files and home paths
+        if not isinstance(username, str) or not USERNAME_PATTERN.fullmatch(username):
+            return {"ok": False, "message": f"[ERROR] Invalid username {json.dumps(username)}."}
+        if op == "exists":
+            return {"ok": True, "exists": self.index.user_exists(username)}
+        if op not in ("create", "update", "delete"):
+            return {"ok": False, "message": f"[ERROR] Unknown operation '{op}'."}
+        if op == "create" and request.get("role") not in VALID_ROLES:
+            return {"ok": False, "message": f"[ERROR] Invalid role specified for user '{username}'"}
+        if op == "update" and request.get("role") not in (None, *VALID_ROLES):
+            return {"ok": False, "message": f"[ERROR] Invalid role specified for user '{username}'"}
+
+        # Hashing starts right away in the warm pool; the batcher waits for it in arrival order
+        loop = asyncio.get_running_loop()
+        hashed = None
+        if op in ("create", "update") and request.get("password"):
+            hashed = loop.run_in_executor(self.pool, hash_password, request["password"], self.rounds)
+        done = loop.create_future()
+        await self.queue.put((request, hashed, done))
+        return await done
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            items = []
+            for request, hashed, done in batch:
+                try:
+                    items.append((request, await hashed if hashed else None, done))
+                except Exception as e:
+                    done.set_result({"ok": False, "message": f"[ERROR] Hashing failed: {e}"})
+            try:
+                results = await loop.run_in_executor(None, self.apply_batch, [item[:2] for item in items])
+            except Exception as e:
+                logging.error(f"Batch of {len(items)} user operations failed: {e}")
+                results = [{"ok": False, "message": f"[ERROR] Unexpected error: {e}"}] * len(items)
+            for (_, _, done), result in zip(items, results):
+                if not done.done():
+                    done.set_result(result)
+
+    def apply_batch(self, items):
+        """Apply (request, password_hash) items in order with one write per account file."""
+        results = []
+        created = []
+        deleted_homes = []
+        changes = MembershipChanges(role_groups(self.admin_group))
+        db = UserDatabase(self.root)
+        with db.lock():
+            for request, password_hash in items:
+                try:
+                    results.append(self.apply_one(db, request, password_hash, changes, created, deleted_homes))
+                except (KeyError, ValueError, RuntimeError) as e:
+                    results.append({"ok": False, "message": f"[ERROR] {e}"})
+            changes.apply_to(db)
+
+        # Old homes go to the trash before new ones are created, in case a user
+        # was deleted and created again within the same batch
+        trash_dirs = set()
+        for username, home in deleted_homes:
+            target = reclaim_home(username, home, self.root, background=False)
+            if target:
+                trash_dirs.add(os.path.dirname(target))
+        for trash in trash_dirs:
+            start_reclaimer(trash)
+        created = [username for username in created if db.user_exists(username)]
+        if created:
+            provision_homes(self.root, [home_entry(db, username) for username in created])
+        logging.info(f"Applied a batch of {len(items)} user operations.")
+        return results
+
+    def apply_one(self, db, request, password_hash, changes, created, deleted_homes):
+        op = request["op"]
+        username = request["username"]
+        if op == "create":
+            if db.user_exists(username):
+                return {"ok": False, "message": f"[ERROR] User '{username}' already exists."}
+            db.add_user(username, password_hash or "!")
+            changes.assign_role(username, request["role"])
+            created.append(username)
+            return {"ok": True, "message": f"[INFO] User '{username}' created successfully."}
+
+        if not db.user_exists(username):
+            return {"ok": False, "message": f"[ERROR] User '{username}' does not exist."}
+        # root and system accounts are never changed over the socket
+        if not is_managed(db, db.users[username]):
+            return {"ok": False, "message": f"[ERROR] User '{username}' is not a regular account."}
+        if op == "update":
+            if password_hash:
+                db.set_password(username, password_hash)
+            if request.get("role"):
+                changes.assign_role(username, request["role"])
+            return {"ok": True, "message": f"[INFO] User '{username}' updated successfully."}
+
+        deleted_homes.append((username, db.users[username][5]))
+        db.delete_user(username)
+        return {"ok": True, "message": f"[INFO] User '{username}' deleted successfully."}
+
+
+def send_request(request, socket_path=DEFAULT_SOCKET):
+    """Send one request to a running daemon and return its response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("rb") as file:
+            return json.loads(file.readline())
+
+
+def run_daemon(socket_path=DEFAULT_SOCKET, root="/", workers=None, rounds=None, window=BATCH_WINDOW):
+    asyncio.run(UserDaemon(socket_path, root, workers=workers, rounds=rounds, window=window).serve())
@@ -0,0 +1,324 @@
+import fcntl
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import roles
+from home_provision import provision_homes
+
+# -----------------------------
+# Bulk Account File Backend
+# -----------------------------
+
+# Default modes for account files that do not exist yet under the root prefix
+FILE_MODES = {
+    "passwd": 0o644,
+    "group": 0o644,
+    "shadow": 0o640,
+    "gshadow": 0o640,
+}
+# Fields per entry, and the fields that must be numeric, for an entry to be used
+FIELD_COUNTS = {"passwd": 7, "shadow": 9, "group": 4, "gshadow": 4}
+NUMERIC_FIELDS = {"passwd": (2, 3), "group": (2,)}
+
+
+class UserDatabase:
+    """In-memory copy of passwd/shadow/group/gshadow that is written back in one pass."""
+
+    def __init__(self, root="/"):
+        self.root = root
+        self.etc = os.path.join(root, "etc")
+        self.entries = {}
+        self.users = {}
+        self.shadow = {}
+        self.groups = {}
+        self.gshadow_groups = {}
+        self.dirty = set()
+        self._removed = set()
+        self._member_of = None
+        self._lock_fd = None
+        self._used_uids = set()
+        self._used_gids = set()
+        self._next_uid = None
+        self._next_gid = None
+        self.defs = {"UID_MIN": 1000, "UID_MAX": 60000, "GID_MIN": 1000, "GID_MAX": 60000}
+
+    def path(self, name):
+        return os.path.join(self.etc, name)
+
+    @contextmanager
+    def lock(self):
+        """Hold the shadow-utils password lock, load the files and commit on success."""
+        os.makedirs(self.etc, exist_ok=True)
+        self._lock_fd = os.open(self.path(".pwd.lock"), os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX)
+            self.load()
+            yield self
+            self.commit()
+        finally:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    def load(self):
+        """Read every account file into memory."""
+        for name in FILE_MODES:
+            self.entries[name] = self._read(name)
+        self.users = self._build_index("passwd")
+        self.shadow = self._build_index("shadow")
+        self.groups = self._build_index("group")
+        self.gshadow_groups = self._build_index("gshadow")
+        self._used_uids = {int(f[2]) for f in self.entries["passwd"] if self._well_formed("passwd", f)}
+        self._used_gids = {int(f[2]) for f in self.entries["group"] if self._well_formed("group", f)}
+        self._read_login_defs()
+        self._next_uid = self.defs["UID_MIN"]
+        self._next_gid = self.defs["GID_MIN"]
+        self._member_of = None
+        self._removed.clear()
+        self.dirty.clear()
+
+    def _read(self, name):
+        try:
+            with open(self.path(name), "r") as file:
+                return [line.rstrip("\n").split(":") for line in file]
+        except FileNotFoundError:
+            return []
+
+    @staticmethod
+    def _well_formed(name, fields) -> bool:
+        return (len(fields) == FIELD_COUNTS[name]
+                and all(fields[i].isdigit() for i in NUMERIC_FIELDS.get(name, ())))
+
+    def _build_index(self, name):
+        """Index the entries of one file by name.
+
+        Malformed lines and later entries with an already seen name are not
+        indexed; they are kept as they are when the file is written back.
+        """
+        index = {}
+        for number, fields in enumerate(self.entries[name], 1):
+            if not self._well_formed(name, fields):
+                if any(field.strip() for field in fields):
+                    logging.warning(f"Ignoring malformed line {number} of '{self.path(name)}'.")
+                continue
+            if fields[0] in index:
+                logging.warning(f"Ignoring duplicate entry '{fields[0]}' on line {number} of '{self.path(name)}'.")
+                continue
+            index[fields[0]] = fields
+        return index
+
+    def _read_login_defs(self):
+        try:
+            with open(self.path("login.defs"), "r") as file:
+                for line in file:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[0] in self.defs and parts[1].isdigit():
+                        self.defs[parts[0]] = int(parts[1])
+        except FileNotFoundError:
+            pass
+
+    def _allocate(self, used, start, limit, preferred=None):
+        if preferred is not None and preferred not in used:
+            used.add(preferred)
+            return preferred, start
+        while start in used:
+            start += 1
+        if start > limit:
+            raise RuntimeError("No free IDs left in the configured range.")
+        used.add(start)
+        return start, start + 1
+
+    def _index(self, name):
+        return {"passwd": self.users, "shadow": self.shadow,
+                "group": self.groups, "gshadow": self.gshadow_groups}[name]
+
+    def _append(self, name, fields, index):
+        self.entries[name].append(fields)
+        index[fields[0]] = fields
+        self.dirty.add(name)
+
+    def _remove(self, name, key):
+        """Drop an indexed entry; commit() leaves it out of the file."""
+        fields = self._index(name).pop(key, None)
+        if fields is not None:
+            self._removed.add(id(fields))
+            self.dirty.add(name)
+        return fields
+
+    def user_exists(self, username) -> bool:
+        return username in self.users
+
+    def add_group(self, group, gid=None):
+        """Create a group (and its gshadow entry) and return its GID."""
+        if group in self.groups:
+            raise ValueError(f"Group '{group}' already exists.")
+        gid, self._next_gid = self._allocate(
+            self._used_gids, self._next_gid, self.defs["GID_MAX"], preferred=gid)
+        self._append("group", [group, "x", str(gid), ""], self.groups)
+        if self.entries["gshadow"] or os.path.exists(self.path("gshadow")):
+            self._append("gshadow", [group, "!", "", ""], self.gshadow_groups)
+        return gid
+
+    def add_user(self, username, password_hash, primary_group=None, groups=(),
+                 home=None, shell="/bin/bash", comment=""):
+        """Add a user in memory and return the new UID."""
+        if username in self.users:
+            raise ValueError(f"User '{username}' already exists.")
+        for group in [primary_group, *groups]:
+            if group is not None and group not in self.groups:
+                raise KeyError(f"Group '{group}' does not exist.")
+        # Like useradd, never take over an existing group as the user-private group
+        if primary_group is None and username in self.groups:
+            raise ValueError(f"Group '{username}' already exists; give it as the primary group to use it.")
+
+        uid, self._next_uid = self._allocate(
+            self._used_uids, self._next_uid, self.defs["UID_MAX"])
+        if primary_group is None:
+            gid = self.add_group(username, gid=uid)
+        else:
+            gid = int(self.groups[primary_group][2])
+
+        home = home or f"/home/{username}"
+        last_change = str(int(time.time() // 86400))
+        self._append("passwd", [username, "x", str(uid), str(gid), comment, home, shell], self.users)
+        self._append("shadow", [username, password_hash, last_change, "0", "99999", "7", "", "", ""],
+                     self.shadow)
+        for group in groups:
+            self.add_to_group(username, group)
+        return uid
+
+    def set_password(self, username, password_hash):
+        """Replace a user's password hash in memory."""
+        fields = self.shadow[username]
+        fields[1] = password_hash
+        fields[2] = str(int(time.time() // 86400))
+        self.dirty.add("shadow")
+
+    def delete_user(self, username):
+        """Remove a user, its memberships and its user-private group in memory."""
+        fields = self.users[username]
+        self._remove("passwd", username)
+        self._remove("shadow", username)
+        for group in list(self.user_groups(username)):
+            self.remove_from_group(username, group)
+        self._member_of.pop(username, None)
+
+        private = self.groups.get(username)
+        if private is not None and private[2] == fields[3] and not private[3]:
+            self._remove("group", username)
+            self._remove("gshadow", username)
+
+    def user_groups(self, username) -> set:
+        """Return the supplementary groups a user is a member of."""
+        if self._member_of is None:
+            self._member_of = {}
+            for group, fields in self.groups.items():
+                for member in fields[3].split(","):
+                    if member:
+                        self._member_of.setdefault(member, set()).add(group)
+        return self._member_of.setdefault(username, set())
+
+    def update_group_members(self, group, add=(), remove=()):
+        """Apply many membership changes to one group with a single split and join."""
+        if group not in self.groups:
+            raise KeyError(f"Group '{group}' does not exist.")
+        add = [username for username in add if username not in remove]
+        remove = set(remove)
+        for name in ("group", "gshadow"):
+            fields = self._index(name).get(group)
+            if fields is None:
+                continue
+            members = [m for m in fields[3].split(",") if m and m not in remove]
+            present = set(members)
+            members += [username for username in dict.fromkeys(add) if username not in present]
+            joined = ",".join(members)
+            if joined != fields[3]:
+                fields[3] = joined
+                self.dirty.add(name)
+        for username in add:
+            self.user_groups(username).add(group)
+        for username in remove:
+            self.user_groups(username).discard(group)
+
+    def add_to_group(self, username, group):
+        """Add a supplementary group membership in memory."""
+        self.update_group_members(group, add=[username])
+
+    def remove_from_group(self, username, group):
+        """Remove a supplementary group membership in memory."""
+        self.update_group_members(group, remove=[username])
+
+    def commit(self):
+        """Atomically replace every account file that changed."""
+        for name in FILE_MODES:
+            if name in self.dirty:
+                # Removed entries are dropped here in one pass; every other line is written back as read
+                self.entries[name] = [f for f in self.entries[name] if id(f) not in self._removed]
+                self._write(name, self.entries[name])
+        self._removed.clear()
+        self.dirty.clear()
+
+    def _write(self, name, entries):
+        path = self.path(name)
+        try:
+            st = os.stat(path)
+            mode, uid, gid = st.st_mode & 0o7777, st.st_uid, st.st_gid
+        except FileNotFoundError:
+            mode, uid, gid = FILE_MODES[name], 0, 0
+
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", dir=self.etc)
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write("".join(":".join(fields) + "\n" for fields in entries))
+                file.flush()
+                os.fchmod(file.fileno(), mode)
+                if os.geteuid() == 0:
+                    os.fchown(file.fileno(), uid, gid)
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        dir_fd = os.open(self.etc, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def home_entry(db, username):
+    """Return (home, uid, gid) for a user in the database."""
+    fields = db.users[username]
+    return fields[5], int(fields[2]), int(fields[3])
+
+
+def provision_users(rows, root="/", admin_group="sudo", create_homes=True):
+    """Create users from (username, role, password_hash) rows in one locked transaction.
+
+    Returns the list of usernames that were created.
+    """
+    created = []
+    changes = roles.MembershipChanges(roles.role_groups(admin_group))
+    db = UserDatabase(root)
+    with db.lock():
+        for username, role, password_hash in rows:
+            if db.user_exists(username):
+                logging.error(f"User '{username}' already exists. Skipping.")
+                continue
+            try:
+                db.add_user(username, password_hash)
+            except (ValueError, RuntimeError) as e:
+                logging.error(f"Failed to create user '{username}': {e}")
+                continue
+            changes.assign_role(username, role)
+            created.append(username)
+        # Role memberships are merged into each group entry once for the whole batch
+        changes.apply_to(db)
+    logging.info(f"Provisioned {len(created)} users under '{root}'.")
+
+    if create_homes:
+        provision_homes(root, [home_entry(db, username) for username in created])
+    return created
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import subprocess
+from collections import namedtuple
+
+# -----------------------------
+# Concurrent User Command Executor
+# -----------------------------
+
+DEFAULT_CONCURRENCY = 8
+
+CommandResult = namedtuple("CommandResult", "argv returncode stderr")
+
+
+class RowResult:
+    """Exit codes of every command run for one user, in order."""
+
+    def __init__(self, username):
+        self.username = username
+        self.results = []
+
+    @property
+    def ok(self) -> bool:
+        return all(result.returncode == 0 for result in self.results)
+
+    @property
+    def returncodes(self) -> list:
+        return [result.returncode for result in self.results]
+
+    def error(self) -> str:
+        for result in self.results:
+            if result.returncode != 0:
+                return (f"'{' '.join(result.argv)}' exited with {result.returncode}: "
+                        f"{result.stderr.strip()}")
+        return ""
+
+
+async def _run_user(username, commands, semaphore, stop_on_error):
+    row = RowResult(username)
+    for argv in commands:
+        # The slot is held per command, so a user's later commands never block other users
+        async with semaphore:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+                _, stderr = await proc.communicate()
+                result = CommandResult(argv, proc.returncode, stderr.decode(errors="replace"))
+            except OSError as e:
+                result = CommandResult(argv, 127, str(e))
+        row.results.append(result)
+        if result.returncode != 0:
+            logging.error(f"Command for user '{username}' failed: {row.error()}")
+            if stop_on_error:
+                break
+    return row
+
+
+async def execute(operations, concurrency=DEFAULT_CONCURRENCY, stop_on_error=True):
+    """Run (username, [argv, ...]) operations concurrently across users.
+
+    Commands for the same user keep their order and run one after another;
+    different users run in parallel, bounded by the concurrency limit.
+    Returns one RowResult per user, in first-seen order.
+    """
+    per_user = {}
+    for username, commands in operations:
+        per_user.setdefault(username, []).extend(commands)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(
+        _run_user(username, commands, semaphore, stop_on_error)
+        for username, commands in per_user.items()))
+
+
+def run_user_commands(operations, concurrency=DEFAULT_CONCURRENCY, stop_on_error=True):
+    """Synchronous wrapper around execute() for scripts without an event loop."""
+    return asyncio.run(execute(operations, concurrency, stop_on_error))
+
+
+def run_commands(username, commands, stop_on_error=True) -> RowResult:
+    """Run one user's commands in order and collect their exit codes."""
+    return run_user_commands([(username, commands)], 1, stop_on_error)[0]
@@ -1,9 +1,20 @@
 import argparse
-import os.path
-import csv
+import getpass
+import os
 import subprocess
 import logging
 
+import passwd_index
+from csv_journal import CheckpointJournal, batched, stream_csv
+from csv_validate import format_problems, preflight, validate_csv
+from hash_pool import hash_rows
+from roles import role_commands
+from user_db import provision_users
+from user_executor import DEFAULT_CONCURRENCY, run_commands, run_user_commands
+from home_reclaim import TRASH_DIR_NAME, format_purge_status, reclaim_home, start_reclaimer
+from user_daemon import BATCH_WINDOW, DEFAULT_SOCKET, run_daemon
+from user_sync import apply_plan, build_plan
+
 # Set up logging
 logging.basicConfig(filename='sys_admin.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -18,8 +29,14 @@ def create_user(username, role):
             return f"[ERROR] User '{username}' already exists."
 
         # Create user with the specified role
-        subprocess.run(['sudo', 'useradd', '-m', '-d', f'/home/{username}', '-s', '/bin/bash', username], check=True)
-        set_permissions(username, role)
+        row = run_commands(username, [
+            ['sudo', 'useradd', '-m', '-d', f'/home/{username}', '-s', '/bin/bash', username],
+            *role_commands(username, role, sudo=True),
+        ])
+        if not row.ok:
+            logging.error(f"Error creating user '{username}': {row.error()}")
+            return f"[ERROR] Error creating user '{username}' (exit codes {row.returncodes})"
+        logging.info(f"Role '{role}' assigned for user '{username}'")
 
         logging.info(f"User '{username}' created successfully with home directory /home/{username}")
         return f"[INFO] User '{username}' created successfully with home directory /home/{username}"
@@ -27,57 +44,131 @@ def create_user(username, role):
     except ValueError as e:
         logging.error(str(e))
         return f"[ERROR] {str(e)}"
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error creating user '{username}': {e}")
-        return f"[ERROR] Error creating user '{username}'"
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return f"[ERROR] Unexpected error: {e}"
 
-def create_multiple_users_from_csv(csv_file):
-    try:
-        with open(csv_file, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                username = row['username']
-                role = row['role']
-                password = row['password']
-
-                if role not in ['admin', 'user']:
-                    logging.error(f"Invalid role specified for user '{username}' in CSV file.")
-                    continue
+def read_csv_rows(records, root='/'):
+    for record in records:
+        row = record.fields
+        username = row['username']
+        role = row['role']
+        password = row['password']
 
-                if user_exists(username):
-                    logging.error(f"User '{username}' already exists. Skipping.")
-                    continue
+        if role not in ['admin', 'user']:
+            logging.error(f"Invalid role specified for user '{username}' in CSV file.")
+            continue
+
+        if passwd_index.user_exists(username, root):
+            logging.error(f"User '{username}' already exists. Skipping.")
+            continue
+
+        yield username, role, password, record
 
-                # Create user and assign role
-                create_user(username, role)
-                set_user_password(username, password)
+def create_multiple_users_from_csv(csv_file, root='/', workers=None, rounds=None, resume=False, from_row=None):
+    try:
+        # Validate the whole file before any account is created
+        if not preflight(csv_file, root):
+            return f"[ERROR] Pre-flight validation failed for {csv_file}; run 'user validate' for details."
+        journal = CheckpointJournal(f"{csv_file}.journal")
+        with open(csv_file, 'rb') as file:
+            records = stream_csv(file, journal, resume=resume, from_row=from_row)
+            # Hash passwords in a process pool and create each chunk of users, roles
+            # and home directories with one write per account file, then journal it
+            for chunk in batched(hash_rows(read_csv_rows(records, root), workers, rounds)):
+                provision_users([row[:3] for row in chunk], root=root)
+                journal.record(row[3] for row in chunk)
 
         logging.info("Batch user creation completed successfully.")
         return "[INFO] Batch user creation completed successfully."
 
-    except FileNotFoundError as e:
+    except FileNotFoundError:
+        logging.error(f"CSV file not found: {csv_file}")
+        return f"[ERROR] CSV file not found: {csv_file}"
+    except PermissionError as e:
+        # Batch creation writes the account files under root itself instead of going through sudo
+        logging.error(f"Batch user creation needs write access to the account files under '{root}': {e}")
+        return f"[ERROR] Batch user creation writes the account files under '{root}' directly; run it as root."
+    except Exception as e:
+        logging.error(f"Unexpected error: {e}")
+        return f"[ERROR] Unexpected error: {e}"
+
+def validate_users_csv(csv_file, root='/'):
+    try:
+        errors, warnings = validate_csv(csv_file, root)
+        if warnings:
+            print(format_problems(warnings))
+        if errors:
+            print(format_problems(errors))
+            return f"[ERROR] {len(errors)} problems found in {csv_file}."
+        return f"[INFO] {csv_file} passed pre-flight validation ({len(warnings)} existing users will be skipped)."
+
+    except FileNotFoundError:
+        logging.error(f"CSV file not found: {csv_file}")
+        return f"[ERROR] CSV file not found: {csv_file}"
+
+def sync_users(csv_file, root='/', dry_run=False, workers=None, rounds=None, delete=False):
+    try:
+        # Diff the CSV against the account files and apply only the differences;
+        # accounts are only deleted on request, and never the operator's own
+        operator = os.environ.get('SUDO_USER') or getpass.getuser()
+        plan = build_plan(csv_file, root, workers=workers, delete=delete, keep={operator})
+        print(plan.format())
+        if dry_run or plan.is_empty():
+            return "[INFO] No changes applied."
+
+        apply_plan(plan, root, workers=workers, rounds=rounds)
+        logging.info(f"User sync from '{csv_file}' completed: {plan.summary()}.")
+        return f"[INFO] User sync completed: {plan.summary()}."
+
+    except FileNotFoundError:
         logging.error(f"CSV file not found: {csv_file}")
         return f"[ERROR] CSV file not found: {csv_file}"
+    except ValueError as e:
+        logging.error(str(e))
+        return f"[ERROR] {str(e)}"
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return f"[ERROR] Unexpected error: {e}"
 
 def delete_user(username):
+    return delete_users([username])
+
+def delete_users(usernames, concurrency=DEFAULT_CONCURRENCY):
     try:
-        if not user_exists(username):
-            logging.error(f"User '{username}' does not exist.")
-            return f"[ERROR] User '{username}' does not exist."
+        messages = []
+        existing = passwd_index.users_exist(usernames)
+        for username in usernames:
+            if not existing[username]:
+                logging.error(f"User '{username}' does not exist.")
+                messages.append(f"[ERROR] User '{username}' does not exist.")
 
-        subprocess.run(['sudo', 'userdel', '-r', username], check=True)
-        logging.info(f"User '{username}' deleted successfully.")
-        return f"[INFO] User '{username}' deleted successfully."
+        # Accounts are removed right away; home directories are renamed into a
+        # trash area and removed by a background reclaimer
+        homes = {username: passwd_index.get_index().get_user(username)[5]
+                 for username in usernames if existing[username]}
+        operations = [(username, [['sudo', 'userdel', username]]) for username in homes]
+        trash_dirs = set()
+        for row in run_user_commands(operations, concurrency):
+            if row.ok:
+                # Homes belong to the deleted users, so they are trashed with sudo like userdel
+                target = reclaim_home(row.username, homes[row.username], background=False, sudo=True)
+                if target is False:
+                    logging.error(f"User '{row.username}' deleted, but its home directory could not be removed.")
+                    messages.append(f"[ERROR] User '{row.username}' deleted, but its home directory "
+                                    f"{homes[row.username]} could not be removed.")
+                    continue
+                if target:
+                    trash_dirs.add(os.path.dirname(target))
+                logging.info(f"User '{row.username}' deleted successfully.")
+                messages.append(f"[INFO] User '{row.username}' deleted successfully.")
+            else:
+                logging.error(f"Error deleting user '{row.username}': {row.error()}")
+                messages.append(f"[ERROR] Error deleting user '{row.username}' (exit codes {row.returncodes})")
+        for trash in trash_dirs:
+            start_reclaimer(trash, sudo=True)
+        return "\n".join(messages)
 
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error deleting user '{username}': {e}")
-        return f"[ERROR] Error deleting user '{username}'"
     except Exception as e:
         logging.error(f"Unexpected error: {e}")
         return f"[ERROR] Unexpected error: {e}"
@@ -99,13 +190,14 @@ def update_user(username, password=None):
         return f"[ERROR] Unexpected error: {e}"
 
 def user_exists(username):
-    result = subprocess.run(['id', username], capture_output=True)
-    return result.returncode == 0
+    return passwd_index.user_exists(username)
 
 def set_permissions(username, role):
-    # Assign permissions based on the role
+    # Assign permissions based on the role through the role-to-group mapping
+    row = run_commands(username, role_commands(username, role, sudo=True))
+    if not row.ok:
+        raise RuntimeError(f"Failed to assign role '{role}' to user '{username}': {row.error()}")
     if role == 'admin':
-        subprocess.run(['sudo', 'usermod', '-aG', 'sudo', username], check=True)
         logging.info(f"Role 'admin' assigned with full access permissions for user '{username}'")
     else:
         logging.info(f"Role 'user' assigned with basic access for user '{username}'")
@@ -120,8 +212,12 @@ def display_help():
     Options:
     --create        Create a single user (requires --username and --role).
     --create-batch  Create multiple users from a CSV file (requires --csv).
-    --delete        Delete a user (requires --username).
+    validate        Check a batch CSV file for problems (requires --csv).
+    sync            Make users match a CSV file (requires --csv, optional --dry-run and --delete).
+    --delete        Delete users (requires --username, accepts several names).
     --update        Update user details (requires --username, optional --password).
+    purge-status    Show deleted home directories that are still being removed.
+    daemon          Serve create/update/delete/exists requests on a UNIX socket.
     """
     print(help_text)
 
@@ -134,10 +230,43 @@ def main():
     user_subparsers = user_parser.add_subparsers(dest='user_command')
 
     # Create user
-    user_subparsers.add_parser('create', help='Create a single user')
-    user_subparsers.add_parser('create-batch', help='Create users from CSV')
-    user_subparsers.add_parser('delete', help='Delete a user')
-    user_subparsers.add_parser('update', help='Update user details')
+    create_parser = user_subparsers.add_parser('create', help='Create a single user')
+    create_parser.add_argument('--username', required=True, help='Username of the user')
+    create_parser.add_argument('--role', required=True, help='Role of the user (admin/user)')
+    batch_parser = user_subparsers.add_parser('create-batch', help='Create users from CSV')
+    batch_parser.add_argument('--csv', required=True, help='CSV file with username,role,password columns')
+    batch_parser.add_argument('--root', default='/', help='Root prefix holding etc/passwd')
+    batch_parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count)')
+    batch_parser.add_argument('--hash-rounds', type=int, help='SHA-512 crypt rounds')
+    batch_parser.add_argument('--resume', action='store_true', help='Resume from the checkpoint journal')
+    batch_parser.add_argument('--from-row', type=int, help='Start at this CSV data row (1-based)')
+    validate_parser = user_subparsers.add_parser('validate', help='Check a batch CSV without creating users')
+    validate_parser.add_argument('--csv', required=True, help='CSV file with username,role,password columns')
+    validate_parser.add_argument('--root', default='/', help='Root prefix holding etc/passwd')
+    sync_parser = user_subparsers.add_parser('sync', help='Make the user database match a CSV')
+    sync_parser.add_argument('--csv', required=True, help='CSV file with the desired users')
+    sync_parser.add_argument('--root', default='/', help='Root prefix holding etc/passwd')
+    sync_parser.add_argument('--dry-run', action='store_true', help='Print the plan without applying it')
+    sync_parser.add_argument('--delete', action='store_true',
+                             help='Also delete managed users that are missing from the CSV')
+    sync_parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count)')
+    sync_parser.add_argument('--hash-rounds', type=int, help='SHA-512 crypt rounds')
+    delete_parser = user_subparsers.add_parser('delete', help='Delete one or more users')
+    delete_parser.add_argument('--username', required=True, nargs='+', help='Usernames to delete')
+    delete_parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                               help='Maximum users deleted at the same time')
+    daemon_parser = user_subparsers.add_parser('daemon', help='Serve user operations on a UNIX socket')
+    daemon_parser.add_argument('--socket', default=DEFAULT_SOCKET, help='UNIX socket path')
+    daemon_parser.add_argument('--root', default='/', help='Root prefix holding etc/passwd')
+    daemon_parser.add_argument('--workers', type=int, help='Password hashing processes (default: CPU count)')
+    daemon_parser.add_argument('--hash-rounds', type=int, help='SHA-512 crypt rounds')
+    daemon_parser.add_argument('--batch-window', type=float, default=BATCH_WINDOW,
+                               help='Seconds to wait for more requests before writing a batch')
+    purge_parser = user_subparsers.add_parser('purge-status', help='Show home directories still being removed')
+    purge_parser.add_argument('--trash', default=os.path.join('/home', TRASH_DIR_NAME), help='Trash directory')
+    update_parser = user_subparsers.add_parser('update', help='Update user details')
+    update_parser.add_argument('--username', required=True, help='Username of the user')
+    update_parser.add_argument('--password', help='New password for the user')
 
     args = parser.parse_args()
 
@@ -145,9 +274,18 @@ def main():
         if args.user_command == 'create':
             print(create_user(args.username, args.role))
         elif args.user_command == 'create-batch':
-            print(create_multiple_users_from_csv(args.csv))
+            print(create_multiple_users_from_csv(args.csv, args.root, args.workers, args.hash_rounds,
+                                                 args.resume, args.from_row))
+        elif args.user_command == 'validate':
+            print(validate_users_csv(args.csv, args.root))
+        elif args.user_command == 'sync':
+            print(sync_users(args.csv, args.root, args.dry_run, args.workers, args.hash_rounds, args.delete))
         elif args.user_command == 'delete':
-            print(delete_user(args.username))
+            print(delete_users(args.username, args.concurrency))
+        elif args.user_command == 'daemon':
+            run_daemon(args.socket, args.root, args.workers, args.hash_rounds, args.batch_window)
+        elif args.user_command == 'purge-status':
+            print(format_purge_status(args.trash))
         elif args.user_command == 'update':
             print(update_user(args.username, args.password))
         else:
@@ -0,0 +1,150 @@
+import csv
+import logging
+import os
+
+from csv_validate import format_problems, validate_csv
+from hash_pool import hash_rows, verify_passwords
+from home_provision import provision_homes
+from home_reclaim import reclaim_home, start_reclaimer
+from roles import MembershipChanges, role_groups, role_of
+from user_db import UserDatabase, home_entry
+
+# -----------------------------
+# Desired-State User Sync
+# -----------------------------
+
+VALID_ROLES = ("admin", "user")
+
+
+class SyncPlan:
+    """The minimal set of changes that makes the account files match a CSV."""
+
+    def __init__(self):
+        self.creates = []           # (username, role, password)
+        self.role_changes = []      # (username, old_role, new_role)
+        self.password_changes = []  # (username, password)
+        self.deletions = []         # username
+        self.kept = []              # username of accounts missing from the CSV that are not deleted
+
+    def is_empty(self) -> bool:
+        return not (self.creates or self.role_changes or self.password_changes or self.deletions)
+
+    def summary(self) -> str:
+        return (f"{len(self.creates)} to create, {len(self.role_changes)} role changes, "
+                f"{len(self.password_changes)} password changes, {len(self.deletions)} to delete")
+
+    def format(self) -> str:
+        lines = [f"+ create {username} ({role})" for username, role, _ in self.creates]
+        lines += [f"~ role {username}: {old} -> {new}" for username, old, new in self.role_changes]
+        lines += [f"~ password {username}" for username, _ in self.password_changes]
+        lines += [f"- delete {username}" for username in self.deletions]
+        lines += [f"= keep {username} (not in the CSV; deleted only with --delete)" for username in self.kept]
+        lines.append(f"Plan: {self.summary()}.")
+        return "\n".join(lines)
+
+
+def read_desired_state(csv_file) -> dict:
+    """Read username -> (role, password) from a CSV, skipping invalid and duplicate rows."""
+    desired = {}
+    with open(csv_file, "r") as file:
+        for row in csv.DictReader(file):
+            username, role, password = row["username"], row["role"], row["password"]
+            if role not in VALID_ROLES:
+                logging.error(f"Invalid role '{role}' for user '{username}'. Skipping.")
+                continue
+            if username in desired:
+                logging.error(f"Duplicate user '{username}' in '{csv_file}'. Keeping the first row.")
+                continue
+            desired[username] = (role, password)
+    return desired
+
+
+def is_managed(db, fields) -> bool:
+    """Only regular login accounts (UID_MIN..UID_MAX) are candidates for deletion."""
+    return db.defs["UID_MIN"] <= int(fields[2]) <= db.defs["UID_MAX"]
+
+
+def build_plan(csv_file, root="/", admin_group="sudo", workers=None, delete=False, keep=()) -> SyncPlan:
+    """Diff the CSV against the current passwd/shadow/group state in one pass.
+
+    The CSV must pass the batch pre-flight checks. Managed accounts missing
+    from it are only planned for deletion with delete, and never those in keep.
+    """
+    errors, _ = validate_csv(csv_file, root)
+    if errors:
+        raise ValueError(f"'{csv_file}' failed pre-flight validation:\n{format_problems(errors)}")
+    desired = read_desired_state(csv_file)
+    db = UserDatabase(root)
+    db.load()
+    plan = SyncPlan()
+
+    existing = []
+    for username, (role, password) in desired.items():
+        if not db.user_exists(username):
+            plan.creates.append((username, role, password))
+            continue
+        current_role = role_of(db, username, role_groups(admin_group))
+        if current_role != role:
+            plan.role_changes.append((username, current_role, role))
+        shadow = db.shadow.get(username)
+        existing.append((username, password, shadow[1] if shadow else ""))
+
+    # Verifying a password costs one crypt() call, so the checks run in the hashing pool
+    pairs = ((password, password_hash) for _, password, password_hash in existing)
+    for (username, password, _), matches in zip(existing, verify_passwords(pairs, workers)):
+        if not matches:
+            plan.password_changes.append((username, password))
+
+    missing = [username for username, fields in db.users.items()
+               if username not in desired and is_managed(db, fields)]
+    if delete:
+        plan.deletions = [username for username in missing if username not in keep]
+        plan.kept = [username for username in missing if username in keep]
+    else:
+        plan.kept = missing
+    return plan
+
+
+def apply_plan(plan, root="/", admin_group="sudo", workers=None, rounds=None, create_homes=True):
+    """Apply a SyncPlan with one write per changed account file."""
+    creates = list(hash_rows(plan.creates, workers, rounds))
+    password_changes = list(hash_rows(
+        ((username, None, password) for username, password in plan.password_changes), workers, rounds))
+
+    created = []
+    deleted_homes = []
+    changes = MembershipChanges(role_groups(admin_group))
+    db = UserDatabase(root)
+    with db.lock():
+        for username, role, password_hash in creates:
+            if db.user_exists(username):
+                logging.warning(f"User '{username}' appeared since planning. Skipping creation.")
+                continue
+            try:
+                db.add_user(username, password_hash)
+            except (ValueError, RuntimeError) as e:
+                logging.error(f"Failed to create user '{username}': {e}")
+                continue
+            changes.assign_role(username, role)
+            created.append(username)
+        for username, _, new_role in plan.role_changes:
+            changes.assign_role(username, new_role)
+        for username, _, password_hash in password_changes:
+            if db.user_exists(username):
+                db.set_password(username, password_hash)
+        for username in plan.deletions:
+            if db.user_exists(username):
+                deleted_homes.append((username, db.users[username][5]))
+                db.delete_user(username)
+        changes.apply_to(db)
+
+    if create_homes:
+        provision_homes(root, [home_entry(db, username) for username in created])
+    trash_dirs = set()
+    for username, home in deleted_homes:
+        target = reclaim_home(username, home, root, background=False)
+        if target:
+            trash_dirs.add(os.path.dirname(target))
+    for trash in trash_dirs:
+        start_reclaimer(trash)
+    logging.info(f"Sync applied under '{root}': {plan.summary()}.")